@@ -0,0 +1,115 @@
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Per-worker limits for the heavy routes: renders running at once, renders allowed to wait, and for how long
+RENDER_CONCURRENCY = int(os.environ.get("RENDER_CONCURRENCY", "2"))
+RENDER_QUEUE_SIZE = int(os.environ.get("RENDER_QUEUE_SIZE", "4"))
+RENDER_QUEUE_WAIT_SECONDS = float(os.environ.get("RENDER_QUEUE_WAIT_SECONDS", "10"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "1"))
+BATCH_QUEUE_SIZE = int(os.environ.get("BATCH_QUEUE_SIZE", "1"))
+BATCH_QUEUE_WAIT_SECONDS = float(os.environ.get("BATCH_QUEUE_WAIT_SECONDS", "5"))
+
+class Saturated(Exception):
+    """A lane has no room; ``status`` is 429 (queue full) or 503 (waited too long)."""
+
+    def __init__(self, message, status, retry_after):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+class Lane:
+    """Bounded admission for one class of requests.
+
+    At most ``limit`` requests run at once; up to ``queue_size`` more wait for
+    at most ``wait_seconds``. Anything beyond that is rejected immediately so
+    callers back off instead of queueing invisibly behind long renders.
+    Requests in other lanes (health checks, job polling) are never blocked.
+    """
+
+    def __init__(self, name, limit, queue_size, wait_seconds):
+        self.name = name
+        self.limit = max(1, limit)
+        self.queue_size = max(0, queue_size)
+        self.wait_seconds = wait_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.avg_seconds = None
+        self.stats = {"admitted": 0, "queued": 0, "rejected_full": 0, "rejected_timeout": 0}
+        self._cond = threading.Condition()
+
+    def retry_after(self):
+        """Seconds until a slot is likely free, from the recent average service time."""
+        average = self.avg_seconds or self.wait_seconds or 1
+        return max(1, math.ceil(average * (self.waiting + 1) / self.limit))
+
+    def _acquire(self):
+        with self._cond:
+            if self.in_flight < self.limit and not self.waiting:
+                self.in_flight += 1
+                self.stats["admitted"] += 1
+                return
+            if self.waiting >= self.queue_size:
+                self.stats["rejected_full"] += 1
+                raise Saturated(f"Server busy: {self.in_flight} {self.name} requests running and "
+                                f"{self.waiting} waiting", 429, self.retry_after())
+            self.waiting += 1
+            self.stats["queued"] += 1
+            deadline = time.monotonic() + self.wait_seconds
+            try:
+                while self.in_flight >= self.limit:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.stats["rejected_timeout"] += 1
+                        raise Saturated(f"Server busy: no {self.name} slot freed within "
+                                        f"{self.wait_seconds:g}s", 503, self.retry_after())
+                    self._cond.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+
+    def _release(self, seconds):
+        with self._cond:
+            self.in_flight -= 1
+            # Exponential moving average of service time, for Retry-After
+            self.avg_seconds = seconds if self.avg_seconds is None else 0.8 * self.avg_seconds + 0.2 * seconds
+            self._cond.notify()
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the duration of the block, or raise Saturated."""
+        self._acquire()
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - started)
+
+    def snapshot(self):
+        with self._cond:
+            return {"limit": self.limit, "queue_size": self.queue_size, "in_flight": self.in_flight,
+                    "waiting": self.waiting, **self.stats}
+
+render_lane = Lane("render", RENDER_CONCURRENCY, RENDER_QUEUE_SIZE, RENDER_QUEUE_WAIT_SECONDS)
+batch_lane = Lane("batch", BATCH_CONCURRENCY, BATCH_QUEUE_SIZE, BATCH_QUEUE_WAIT_SECONDS)
+
+_LANES = (render_lane, batch_lane)
+
+def lane_capacity():
+    """Request threads the lanes can occupy at once (running plus waiting)."""
+    return sum(lane.limit + lane.queue_size for lane in _LANES)
+register_stats("onepager_lane_in_flight", "Requests running in each admission lane.",
+               lambda: {lane.name: lane.in_flight for lane in _LANES}, "lane", kind="gauge")
+register_stats("onepager_lane_waiting", "Requests waiting for a slot in each admission lane.",
+               lambda: {lane.name: lane.waiting for lane in _LANES}, "lane", kind="gauge")
+register_stats("onepager_lane_events_total", "Admission decisions per lane.",
+               lambda: {(lane.name, event): count for lane in _LANES for event, count in lane.stats.items()},
+               ("lane", "event"))
@@ -1,37 +1,217 @@
-from flask import Flask, request, jsonify
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, jsonify, g, make_response, send_file
 import os
 import base64
+import binascii
 import logging
-from mbs import process_excel_data  # Your existing processing function
+from functools import wraps
+from admission import Saturated, render_lane, batch_lane
+import metrics
+from metrics import timed_stage, payload_bytes
+from profiling import request_profiler
+from structured_logging import configure_logging, begin_request, debug_enabled, redact
+from jobs import JobRunner, QueueFull, DONE, FAILED, job_status
+import warmup
+# mbs and batch (pandas, openpyxl, SQLAlchemy) are imported on first use, so /ping stays light
 
 app = Flask(__name__)
 
 # === CONFIG ===
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Folder where uploaded files will be stored
-UPLOAD_FOLDER = os.path.join(BASE_DIR, "input", "non_cricket_input")
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)  # Ensure folder exists
-
 # Reference files
 SKELETON_FILE = os.path.join(BASE_DIR, "input", "Skeleton Output.xlsx")
 ER_CPRP_FILE = os.path.join(BASE_DIR, "input", "ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx")
 TVR_OUTPUT_FILE = os.path.join(BASE_DIR, "input", "TVR Output.xlsx")
 
-# Logging
-VERBOSE_LOGGING = True
+# Binary request/response mode
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+OUTPUT_FILENAME = "Completed_Output.xlsx"
+REQUIRED_FILE_TYPES = ["input_a", "input_b"]
+
+# Logging: structured, queue-based and tagged with a request id (see structured_logging.py);
+# with VERBOSE_LOGGING, DEBUG records are kept for a sample of requests (LOG_DEBUG_SAMPLE_RATE)
+VERBOSE_LOGGING = os.environ.get("VERBOSE_LOGGING", "1") != "0"
 log_level = logging.DEBUG if VERBOSE_LOGGING else logging.INFO
-logging.basicConfig(level=log_level, format='%(asctime)s - %(levelname)s - %(message)s')
+configure_logging(log_level)
 logger = logging.getLogger(__name__)
 
+# Background jobs for long-running renders (see /jobs routes)
+job_runner = JobRunner(lane=render_lane)
+
+# Routes that never touch the processing stack
+LIGHT_ENDPOINTS = {"ping", "ready", "metrics"}
+
 # === HELPERS ===
-def is_base64_encoded(data):
-  """Check if a string is valid Base64."""
+def decode_base64(data):
+  """Decode Base64 in a single pass; returns None if it is not valid Base64."""
   try:
-      base64.b64decode(data)
-      return True
-  except Exception:
-      return False
+      return base64.b64decode(data)
+  except (binascii.Error, ValueError, TypeError):
+      return None
+
+class RequestError(Exception):
+  """Invalid request payload; reported to the caller as a 400."""
+
+def collect_input_files(body):
+  """Decode the uploaded workbooks in ``body`` into {file-type: bytes}.
+
+  Accepts either {"files": [...]} or a single file object, and raises
+  RequestError when a file is malformed or input_a/input_b is missing.
+  """
+  # Accept either a list of files or a single file object
+  if "files" in body and isinstance(body["files"], list):
+      files = body["files"]
+  else:
+      files = [body]
+
+  if not files:
+      raise RequestError("No files to process")
+
+  file_map = {}
+
+  for file_info in files:
+      filename = file_info.get("xlsx-name")
+      attach_body = file_info.get("attach-body")
+      file_type = file_info.get("file-type")  # must be 'input_a' or 'input_b'
+
+      logger.debug("Processing file: %s of type %s", filename, file_type)
+
+      if not attach_body or not filename or not file_type:
+          raise RequestError(f"File '{filename}': Missing 'attach-body', 'xlsx-name', or 'file-type'")
+
+      content = attach_body.get("contentBytes")
+      if not content:
+          raise RequestError(f"File '{filename}': Missing 'contentBytes' in attach-body")
+
+      decoded_bytes = decode_base64(content)
+      if decoded_bytes is None:
+          raise RequestError(f"File '{filename}': Invalid base64 content")
+
+      logger.info("File decoded in memory: %s (%d bytes)", filename, len(decoded_bytes))
+
+      file_map[file_type] = decoded_bytes
+
+  return require_input_files(file_map)
+
+def require_input_files(file_map):
+  """Ensure both required file types are present."""
+  missing_types = [ft for ft in REQUIRED_FILE_TYPES if ft not in file_map]
+
+  if missing_types:
+      raise RequestError(f"Missing required files: {', '.join(missing_types)}")
+
+  return file_map
+
+def collect_multipart_files(files):
+  """Read raw workbook uploads from multipart form fields named input_a and input_b."""
+  file_map = {}
+  for file_type in REQUIRED_FILE_TYPES:
+      upload = files.get(file_type)
+      if upload is None:
+          continue
+      data = upload.read()
+      if not data:
+          raise RequestError(f"File '{upload.filename}': Empty upload for '{file_type}'")
+      logger.info("Received binary upload: %s of type %s (%d bytes)", upload.filename, file_type, len(data))
+      file_map[file_type] = data
+
+  return require_input_files(file_map)
+
+def read_request_files():
+  """Input workbooks from either a multipart/form-data or a JSON (base64) request."""
+  with timed_stage("decode"):
+      if request.mimetype == "multipart/form-data":
+          file_map = collect_multipart_files(request.files)
+      else:
+          body = request.get_json(silent=True)
+          if not isinstance(body, dict):
+              raise RequestError("Request body must be JSON or multipart/form-data")
+          if debug_enabled(logger):
+              logger.debug("Request JSON body: %s", redact(body))
+          file_map = collect_input_files(body)
+
+  for file_type, data in file_map.items():
+      payload_bytes.observe(len(data), file_type)
+  return file_map
+
+def output_response(output_data):
+  """Return the workbook as raw xlsx if the client Accepts it, else base64 in JSON."""
+  best = request.accept_mimetypes.best_match(["application/json", XLSX_MIMETYPE], default="application/json")
+  if best == XLSX_MIMETYPE:
+      headers = {"Content-Disposition": f'attachment; filename="{OUTPUT_FILENAME}"'}
+      return Response(output_data, mimetype=XLSX_MIMETYPE, headers=headers), 200
+
+  with timed_stage("encode"):
+      result = {
+          "status": "success",
+          "data": base64.b64encode(output_data).decode('utf-8'),
+          "output_filename": OUTPUT_FILENAME
+      }
+      return jsonify(result), 200
+
+@app.before_request
+def start_request():
+  g.request_started = time.perf_counter()
+  g.request_id = begin_request(request.headers.get("X-Request-ID", "")[:64] or None)
+
+@app.after_request
+def record_request(response):
+  if "request_started" not in g:
+      return response
+  elapsed = time.perf_counter() - g.request_started
+  endpoint = request.endpoint or "unmatched"
+  metrics.requests_total.inc(endpoint, str(response.status_code))
+  metrics.request_seconds.observe(elapsed, endpoint)
+  response.headers["X-Request-ID"] = g.request_id
+  fields = {"http_method": request.method, "path": request.path, "status": response.status_code,
+            "duration_ms": round(elapsed * 1000, 1), "response_bytes": response.calculate_content_length()}
+  if endpoint in LIGHT_ENDPOINTS:
+      logger.debug("%s %s -> %d", request.method, request.path, response.status_code, extra={"fields": fields})
+  else:
+      logger.info("%s %s -> %d in %.1f ms", request.method, request.path, response.status_code, elapsed * 1000,
+                  extra={"fields": fields})
+      warmup.record_request(endpoint, elapsed)
+  return response
+
+def admitted(lane):
+  """Run the route inside ``lane``; reject with 429/503 and Retry-After when it is saturated."""
+  def decorator(view):
+      @wraps(view)
+      def wrapper(*args, **kwargs):
+          try:
+              with lane.admit():
+                  return view(*args, **kwargs)
+          except Saturated as e:
+              logger.warning(str(e))
+              return jsonify({"error": str(e)}), e.status, {"Retry-After": str(e.retry_after)}
+      return wrapper
+  return decorator
+
+def profiled(view):
+  """Capture a cProfile/tracemalloc profile of the route when sampled or asked for.
+
+  Callers ask with ``?profile=1`` or ``X-Profile: 1`` plus a valid ``X-Profile-Token``;
+  the capture id is returned in the ``X-Profile-Id`` response header.
+  """
+  @wraps(view)
+  def wrapper(*args, **kwargs):
+      requested = request.args.get("profile") == "1" or request.headers.get("X-Profile") == "1"
+      if requested and not request_profiler.authorized(request.headers.get("X-Profile-Token")):
+          return jsonify({"error": "Profiling requires a valid X-Profile-Token"}), 403
+      with request_profiler.capture(request.endpoint, requested) as profile:
+          response = make_response(view(*args, **kwargs))
+      if profile is not None:
+          response.headers["X-Profile-Id"] = profile["id"]
+      return response
+  return wrapper
+
+def profile_access_denied():
+  if not request_profiler.authorized(request.headers.get("X-Profile-Token")):
+      return jsonify({"error": "A valid X-Profile-Token is required"}), 403
+  return None
 
 # === ROUTES ===
 @app.route('/ping', methods=['GET'])
@@ -39,103 +219,212 @@ def ping():
   """Health check endpoint."""
   return jsonify({"status": "ok"}), 200
 
-@app.route('/process_pager_excelfile', methods=['POST'])
-def process_pager_excelfile():
+@app.route('/ready', methods=['GET'])
+def ready():
+  """Readiness/warm-up probe: loads the processing stack and templates if needed, then reports timings."""
   try:
-      body = request.get_json()
-      if VERBOSE_LOGGING:
-          logger.debug("Request JSON body: %s", body)
+      timings = warmup.warm_up(SKELETON_FILE)
+  except Exception as e:
+      logger.exception("Warm-up failed.")
+      return jsonify({"status": "unavailable", "error": str(e)}), 503
+  lanes = {lane.name: lane.snapshot() for lane in (render_lane, batch_lane)}
+  return jsonify({"status": "ready", "timings": timings, "lanes": lanes, "jobs_queued": job_runner.queue_depth()}), 200
 
-      # Accept either a list of files or a single file object
-      if "files" in body and isinstance(body["files"], list):
-          files = body["files"]
-      else:
-          files = [body]
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+  """Prometheus metrics for this worker: stage and request latencies, errors, DB retries, payload sizes, caches."""
+  return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
-      if not files:
-          msg = "No files to process"
-          logger.error(msg)
-          return jsonify({"error": msg}), 400
+@app.route('/process_pager_excelfile', methods=['POST'])
+@admitted(render_lane)
+@profiled
+def process_pager_excelfile():
+  """Render a one-pager.
 
-      file_map = {}
+  Accepts JSON with base64 ``contentBytes`` or multipart/form-data with
+  ``input_a``/``input_b`` file fields. Responds with base64-in-JSON, or the
+  raw workbook when the client Accepts the xlsx (spreadsheetml) mimetype.
+  With ``?format=summary`` no workbook is rendered; the computed GRPs, costs
+  and CPRPs are returned as JSON instead.
+  """
+  try:
+      try:
+          file_map = read_request_files()
+      except RequestError as e:
+          logger.error(str(e))
+          return jsonify({"error": str(e)}), 400
 
-      for file_info in files:
-          filename = file_info.get("xlsx-name")
-          attach_body = file_info.get("attach-body")
-          file_type = file_info.get("file-type")  # must be 'input_a' or 'input_b'
+      from mbs import process_excel_data
 
-          logger.info("Processing file: %s of type %s", filename, file_type)
+      if request.args.get("format") == "summary":
+          summary = process_excel_data(file_map["input_a"], file_map["input_b"], SKELETON_FILE, summary=True)
+          return jsonify({"status": "success", "summary": summary}), 200
 
-          if not attach_body or not filename or not file_type:
-              msg = f"File '{filename}': Missing 'attach-body', 'xlsx-name', or 'file-type'"
-              logger.error(msg)
-              return jsonify({"error": msg}), 400
+      # Process the Excel files entirely in memory
+      output_data = process_excel_data(
+          file_map["input_a"],
+          file_map["input_b"],
+          SKELETON_FILE
+      )
 
-          content = attach_body.get("contentBytes")
-          if not content:
-              msg = f"File '{filename}': Missing 'contentBytes' in attach-body"
-              logger.error(msg)
-              return jsonify({"error": msg}), 400
+      if not output_data:
+          raise RuntimeError("Output workbook was not generated")
 
-          if not is_base64_encoded(content):
-              msg = f"File '{filename}': Invalid base64 content"
-              logger.error(msg)
-              return jsonify({"error": msg}), 400
+      logger.info("Files processed successfully. Output size: %d bytes", len(output_data))
 
-          decoded_bytes = base64.b64decode(content)
-          input_path = os.path.join(UPLOAD_FOLDER, filename)
+      return output_response(output_data)
 
-          with open(input_path, "wb") as f:
-              f.write(decoded_bytes)
-          logger.info("File saved successfully to: %s", input_path)
+  except Exception as e:
+      logger.exception("An error occurred while processing the request.")
+      return jsonify({"error": str(e)}), 500
 
-          file_map[file_type] = input_path
+@app.route('/process_pager_batch', methods=['POST'])
+@admitted(batch_lane)
+def process_pager_batch():
+  """Render many one-pagers in parallel.
 
-      # Ensure both required file types are present
-      required_types = ["input_a", "input_b"]
-      missing_types = [ft for ft in required_types if ft not in file_map]
+  Body: {"items": [{"id": ..., "files": [...]}, ...]} where each item uses the
+  same file format as /process_pager_excelfile. Returns one result per item,
+  with per-item errors instead of failing the whole batch.
+  """
+  try:
+      from batch import render_batch
 
-      if missing_types:
-          msg = f"Missing required files: {', '.join(missing_types)}"
+      body = request.get_json(silent=True)
+      if not isinstance(body, dict):
+          msg = "Request body must be a JSON object"
+          logger.error(msg)
+          return jsonify({"error": msg}), 400
+      items = body.get("items")
+      if not isinstance(items, list) or not items:
+          msg = "Request must contain a non-empty 'items' list"
           logger.error(msg)
           return jsonify({"error": msg}), 400
 
-      # Process the Excel files
-      output_file = os.path.join(UPLOAD_FOLDER, "Completed_Output.xlsx")
-      process_excel_data(
-          file_map["input_a"],
-          file_map["input_b"],
-          SKELETON_FILE,
-          output_file
-      )
+      results = {}
+      jobs = []
+      for index, item in enumerate(items):
+          item_id = item.get("id", index) if isinstance(item, dict) else index
+          try:
+              if not isinstance(item, dict):
+                  raise RequestError("Batch item must be an object")
+              file_map = collect_input_files(item)
+          except RequestError as e:
+              logger.error("Batch item %s: %s", item_id, e)
+              results[index] = {"id": item_id, "status": "error", "error": str(e)}
+              continue
+          jobs.append((index, file_map["input_a"], file_map["input_b"]))
 
-      if not os.path.exists(output_file):
-          raise FileNotFoundError(f"Output file not created: {output_file}")
+      logger.info("Rendering batch of %d one-pagers (%d invalid)", len(jobs), len(results))
+      for index, output_data, error in render_batch(jobs, SKELETON_FILE):
+          item_id = items[index].get("id", index)
+          if error:
+              results[index] = {"id": item_id, "status": "error", "error": error}
+          else:
+              results[index] = {
+                  "id": item_id,
+                  "status": "success",
+                  "data": base64.b64encode(output_data).decode('utf-8'),
+                  "output_filename": OUTPUT_FILENAME
+              }
 
-      logger.info(f"Files processed successfully. Output saved to {output_file}")
+      ordered = [results[index] for index in range(len(items))]
+      failed = sum(1 for r in ordered if r["status"] != "success")
+      return jsonify({"status": "success" if not failed else "partial", "failed": failed, "results": ordered}), 200
 
-      with open(output_file, "rb") as f:
-          output_data = f.read()
-      encoded_output = base64.b64encode(output_data).decode('utf-8')
+  except Exception as e:
+      logger.exception("An error occurred while processing the batch request.")
+      return jsonify({"error": str(e)}), 500
 
-      result = {
-          "status": "success",
-          "data": encoded_output,
-          "output_filename": "Completed_Output.xlsx"
-      }
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+  """Queue a one-pager render and return its job id immediately.
 
-      return jsonify(result), 200
+  Takes the same JSON or multipart body as /process_pager_excelfile. Poll GET /jobs/<id> and
+  fetch the workbook from GET /jobs/<id>/result once status is 'done'.
+  """
+  try:
+      try:
+          file_map = read_request_files()
+      except RequestError as e:
+          logger.error(str(e))
+          return jsonify({"error": str(e)}), 400
+
+      from mbs import process_excel_data
+
+      try:
+          job_id = job_runner.submit(process_excel_data, file_map["input_a"], file_map["input_b"], SKELETON_FILE)
+      except QueueFull as e:
+          logger.warning(str(e))
+          return jsonify({"error": str(e)}), 503, {"Retry-After": "30"}
+
+      return jsonify({"status": "queued", "job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
 
   except Exception as e:
-      logger.exception("An error occurred while processing the request.")
+      logger.exception("An error occurred while submitting the job.")
       return jsonify({"error": str(e)}), 500
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+  """Job status: queued, running, done or failed."""
+  job = job_runner.get(job_id)
+  if job is None:
+      return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+  return jsonify(job_status(job)), 200
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+  """Completed workbook for a finished job, in the /process_pager_excelfile response format."""
+  job = job_runner.get(job_id)
+  if job is None:
+      return jsonify({"error": f"Unknown job '{job_id}'"}), 404
+  if job["status"] == FAILED:
+      return jsonify({"error": job["error"], "job_id": job_id}), 500
+  if job["status"] != DONE:
+      return jsonify({"status": job["status"], "job_id": job_id}), 409
+
+  return output_response(job["result"])
+
+@app.route('/profiles', methods=['GET'])
+def list_profiles():
+  """Stored request profiles on this instance, newest first."""
+  denied = profile_access_denied()
+  if denied:
+      return denied
+  return jsonify({"profiles": request_profiler.list()}), 200
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+  """Summary of one capture: wall time, memory peak, top functions and allocation sites."""
+  denied = profile_access_denied()
+  if denied:
+      return denied
+  summary = request_profiler.summary(profile_id)
+  if summary is None:
+      return jsonify({"error": f"Unknown profile '{profile_id}'"}), 404
+  return jsonify(summary), 200
+
+@app.route('/profiles/<profile_id>/download', methods=['GET'])
+def download_profile(profile_id):
+  """Raw cProfile stats for one capture (open with pstats or snakeviz)."""
+  denied = profile_access_denied()
+  if denied:
+      return denied
+  path = request_profiler.path(profile_id, "prof")
+  if path is None:
+      return jsonify({"error": f"Unknown profile '{profile_id}'"}), 404
+  return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=f"{profile_id}.prof")
+
 # === UTILITY ===
 def encode_file_to_base64(path):
   """Utility to encode a file to Base64."""
   with open(path, "rb") as f:
       return base64.b64encode(f.read()).decode('utf-8')
 
+metrics.register_stats("onepager_jobs_queued", "Background jobs waiting for a worker.", job_runner.queue_depth, kind="gauge")
+
+warmup.timings["import_app_ms"] = round((time.perf_counter() - _import_started) * 1000, 1)
+
 if __name__ == '__main__':
   # Example: Generate Base64 for testing
   base64_a = encode_file_to_base64(os.path.join("input", "non_cricket_input", "Non Cricket Input.xlsx"))
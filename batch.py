@@ -0,0 +1,106 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from mbs import process_excel_data
+from tvr_processor import extract_tvr_data_bulk
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def available_cores():
+    """Cores this container may actually use (respects CPU affinity / cgroup pinning)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def pool_size():
+    return int(os.environ.get("BATCH_WORKERS", available_cores()))
+
+def get_pool():
+    """Lazily create the per-worker process pool used for batch rendering.
+
+    Uses the spawn start method so children never inherit locks held by the
+    web server's threads at fork time.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            size = pool_size()
+            logger.info(f"Starting batch process pool with {size} workers")
+            _pool = ProcessPoolExecutor(max_workers=size, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def discard_pool(broken):
+    """Forget ``broken`` (a pool whose child died) so the next ``get_pool`` starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is not broken:
+            return
+        _pool = None
+    logger.warning("Batch process pool is broken (a child process died); it will be restarted")
+    broken.shutdown(wait=False, cancel_futures=True)
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+def render_one_pager(input_a, input_b, skeleton_path, tvrs=None):
+    """Pool task: render one one-pager and return the workbook bytes."""
+    return process_excel_data(input_a, input_b, skeleton_path, tvrs=tvrs)
+
+def render_batch(items, skeleton_path):
+    """Render many one-pagers in parallel across the process pool.
+
+    ``items`` is a list of (item id, input_a bytes, input_b bytes). Returns a
+    list of (item id, output bytes or None, error message or None) in input
+    order; one failing item does not affect the others.
+
+    The TVRs of every item are looked up here first, in one bulk round trip
+    (``extract_tvr_data_bulk``), so the children make no TVR queries.
+    """
+    tvrs = extract_tvr_data_bulk([input_a for _, input_a, _ in items])
+    pool = get_pool()
+    submitted = []
+    for (item_id, input_a, input_b), item_tvrs in zip(items, tvrs):
+        args = (render_one_pager, input_a, input_b, skeleton_path, item_tvrs)
+        try:
+            try:
+                future = pool.submit(*args)
+            except BrokenProcessPool:
+                # A child died after the previous batch: retry once on a fresh pool
+                discard_pool(pool)
+                pool = get_pool()
+                future = pool.submit(*args)
+            submitted.append((item_id, pool, future, None))
+        except Exception as e:
+            logger.exception(f"Batch item {item_id} could not be submitted")
+            submitted.append((item_id, None, None, str(e)))
+
+    results = []
+    for item_id, item_pool, future, error in submitted:
+        if error:
+            results.append((item_id, None, error))
+            continue
+        try:
+            output = future.result()
+            if not output:
+                raise RuntimeError("Output workbook was not generated")
+            results.append((item_id, output, None))
+        except BrokenProcessPool as e:
+            logger.error(f"Batch item {item_id} failed: {e}")
+            discard_pool(item_pool)
+            results.append((item_id, None, str(e)))
+        except Exception as e:
+            logger.exception(f"Batch item {item_id} failed")
+            results.append((item_id, None, str(e)))
+    return results
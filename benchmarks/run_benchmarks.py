@@ -0,0 +1,239 @@
+"""Offline benchmarks for the one-pager pipeline.
+
+Generates synthetic Non Cricket Input workbooks, swaps in a stubbed TVR
+source (no SQL Server needed) and measures:
+
+* ``pipeline``: ``process_excel_data`` called directly, one input at a time,
+  with per-stage timings taken from the ``onepager_stage_seconds`` metric;
+* ``endpoint``: POST /process_pager_excelfile through the Flask test client
+  with N concurrent clients (``--clients 1,4,8``), reporting throughput,
+  latency percentiles and status codes;
+* peak RSS of the benchmark process after each phase.
+
+Results are written to ``benchmarks/results/<timestamp>_<commit>.json``;
+``--compare`` prints the change against an earlier result and exits with
+status 1 when p50 latency or throughput regresses by more than ``--max-regression``.
+
+    python benchmarks/run_benchmarks.py --inputs 12 --clients 1,4,8 --requests 24
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<earlier>.json
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BASE_DIR, "benchmarks", "results")
+
+# Keep runs hermetic and comparable: no cross-request caches, no on-disk records,
+# and let the render lane queue everything so its concurrency limit is what is measured
+BENCH_ENV = {
+    "OUTPUT_CACHE_MAX_BYTES": "0",
+    "TVR_CACHE_SIZE": "0",
+    "TVR_CACHE_PATH": "",
+    "DIAGNOSTICS_ENABLED": "0",
+    "RENDER_QUEUE_SIZE": "1000",
+    "RENDER_QUEUE_WAIT_SECONDS": "600",
+    "VERBOSE_LOGGING": "0",
+    "TVR_SQL_POOL_WARMUP": "0",
+}
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def latency_summary(seconds):
+    return {
+        "count": len(seconds),
+        "mean_ms": round(statistics.mean(seconds) * 1000, 1) if seconds else None,
+        "p50_ms": round(percentile(seconds, 0.5) * 1000, 1) if seconds else None,
+        "p95_ms": round(percentile(seconds, 0.95) * 1000, 1) if seconds else None,
+        "max_ms": round(max(seconds) * 1000, 1) if seconds else None,
+    }
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def stage_totals():
+    from metrics import stage_seconds
+    return {labels[0]: totals for labels, totals in stage_seconds.totals().items()}
+
+def stage_delta(before, after):
+    """Mean milliseconds and call count per stage between two ``stage_totals`` snapshots."""
+    stages = {}
+    for stage, (count, total) in sorted(after.items()):
+        prev_count, prev_total = before.get(stage, (0, 0.0))
+        if count > prev_count:
+            stages[stage] = {"calls": count - prev_count,
+                             "mean_ms": round((total - prev_total) / (count - prev_count) * 1000, 2)}
+    return stages
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_pipeline(inputs, repeat, skeleton_path):
+    from mbs import process_excel_data
+    before = stage_totals()
+    latencies = []
+    for _ in range(repeat):
+        for variant, input_a, input_b in inputs:
+            started = time.perf_counter()
+            output = process_excel_data(input_a, input_b, skeleton_path)
+            latencies.append(time.perf_counter() - started)
+            if not output:
+                raise RuntimeError(f"No output for synthetic input {variant['index']}")
+    return {"latency": latency_summary(latencies), "stages": stage_delta(before, stage_totals()),
+            "peak_rss_mb": peak_rss_mb()}
+
+def request_body(input_a, input_b):
+    return {"files": [
+        {"xlsx-name": "input_a.xlsx", "file-type": "input_a",
+         "attach-body": {"contentBytes": base64.b64encode(input_a).decode("ascii")}},
+        {"xlsx-name": "input_b.xlsx", "file-type": "input_b",
+         "attach-body": {"contentBytes": base64.b64encode(input_b).decode("ascii")}},
+    ]}
+
+def run_endpoint(inputs, clients, requests_per_level):
+    from app import app
+    bodies = [request_body(input_a, input_b) for _, input_a, input_b in inputs]
+    results = {}
+    for concurrency in clients:
+        client = app.test_client()
+
+        def send(number):
+            started = time.perf_counter()
+            response = client.post("/process_pager_excelfile", json=bodies[number % len(bodies)])
+            response.get_data()
+            return response.status_code, time.perf_counter() - started
+
+        before = stage_totals()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            responses = list(executor.map(send, range(requests_per_level)))
+        wall = time.perf_counter() - started
+
+        statuses = {}
+        for status, _ in responses:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        ok = [seconds for status, seconds in responses if status == 200]
+        results[str(concurrency)] = {
+            "requests": requests_per_level,
+            "statuses": statuses,
+            "wall_seconds": round(wall, 3),
+            "throughput_rps": round(len(ok) / wall, 2) if wall else None,
+            "latency": latency_summary(ok),
+            "stages": stage_delta(before, stage_totals()),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        print(f"  {concurrency:>3} clients: {results[str(concurrency)]['throughput_rps']} req/s, "
+              f"p50 {results[str(concurrency)]['latency']['p50_ms']} ms, statuses {statuses}", file=sys.stderr)
+    return results
+
+def compare(current, baseline, max_regression):
+    """Print p50/throughput changes against ``baseline``; returns the list of regressions."""
+    regressions = []
+    rows = [("pipeline p50 ms", baseline["pipeline"]["latency"]["p50_ms"], current["pipeline"]["latency"]["p50_ms"], False)]
+    for level, result in current.get("endpoint", {}).items():
+        old = baseline.get("endpoint", {}).get(level)
+        if old:
+            rows.append((f"endpoint x{level} p50 ms", old["latency"]["p50_ms"], result["latency"]["p50_ms"], False))
+            rows.append((f"endpoint x{level} req/s", old["throughput_rps"], result["throughput_rps"], True))
+    rows.append(("peak RSS MB", baseline.get("peak_rss_mb"), current.get("peak_rss_mb"), False))
+
+    print(f"\nAgainst {baseline['meta']['commit']} ({baseline['meta']['timestamp']}):")
+    for name, old, new, higher_is_better in rows:
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better else change
+        flag = "  REGRESSION" if worse > max_regression else ""
+        print(f"  {name:<24} {old:>10} -> {new:>10} ({change:+.1%}){flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--inputs", type=int, default=12, help="synthetic input workbooks to generate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=2, help="passes over the inputs in the pipeline phase")
+    parser.add_argument("--clients", default="1,4,8", help="comma-separated concurrency levels for the endpoint phase")
+    parser.add_argument("--requests", type=int, default=24, help="requests sent at each concurrency level")
+    parser.add_argument("--tvr-latency-ms", type=float, default=50, help="delay of each stubbed TVR query")
+    parser.add_argument("--skip-endpoint", action="store_true")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<timestamp>_<commit>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed fractional slowdown before failing")
+    args = parser.parse_args()
+
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, BASE_DIR)
+    os.chdir(BASE_DIR)
+
+    import logging
+    import warmup
+    from app import SKELETON_FILE
+    from tvr_processor import set_tvr_source
+    from benchmarks.synthetic import generate_inputs, StubTVRSource
+
+    logging.getLogger().setLevel(logging.WARNING)
+    set_tvr_source(StubTVRSource(args.tvr_latency_ms / 1000))
+
+    print(f"Generating {args.inputs} synthetic inputs...", file=sys.stderr)
+    inputs = generate_inputs(args.inputs, args.seed)
+    warm_up_timings = dict(warmup.warm_up(SKELETON_FILE))
+
+    print("Pipeline (process_excel_data)...", file=sys.stderr)
+    result = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "env": {key: os.environ.get(key) for key in
+                    list(BENCH_ENV) + ["OUTPUT_WRITER", "EVALUATE_FORMULAS", "INPUT_READER", "RENDER_CONCURRENCY"]},
+            "input_bytes": [len(input_a) for _, input_a, _ in inputs],
+        },
+        "warm_up": warm_up_timings,
+        "pipeline": run_pipeline(inputs, args.repeat, SKELETON_FILE),
+    }
+    print(f"  p50 {result['pipeline']['latency']['p50_ms']} ms over {result['pipeline']['latency']['count']} renders",
+          file=sys.stderr)
+    if not args.skip_endpoint:
+        print("Endpoint (POST /process_pager_excelfile)...", file=sys.stderr)
+        clients = [int(level) for level in args.clients.split(",") if level.strip()]
+        result["endpoint"] = run_endpoint(inputs, clients, args.requests)
+    result["peak_rss_mb"] = peak_rss_mb()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.now():%Y%m%d-%H%M%S}_{result['meta']['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.max_regression):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
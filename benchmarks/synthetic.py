@@ -0,0 +1,113 @@
+"""Synthetic one-pager inputs and a stubbed TVR backend for the offline benchmarks.
+
+Workbooks are derived from the sample "Non Cricket Input.xlsx" so every sheet
+and cell the pipeline reads keeps a realistic type; only the varied cells are
+rewritten. Channels are drawn from the ER/CPRP reference so lookups hit.
+"""
+import hashlib
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pandas as pd
+from openpyxl import load_workbook
+
+from input_workbook import PROPERTY_DETAILS, CHANNEL_PLATFORM, PROGRAM_PERFORMANCE
+from reference_data import ER_CPRP_FILENAME
+from tvr_sources import TVRSource, split_channels
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_INPUT_A = os.path.join(BASE_DIR, "input", "non_cricket_input", "Non Cricket Input.xlsx")
+SAMPLE_INPUT_B = os.path.join(BASE_DIR, "input", "TVR Output.xlsx")
+ER_CPRP_FILE = os.path.join(BASE_DIR, "input", ER_CPRP_FILENAME)
+
+PROGRAMS = ["BIGG BOSS 8", "Dance Bangla Dance", "Super Singer", "Khatron Ke Khiladi", "Indian Idol"]
+REGIONS = ["AP / Telangana", "HSM U+R", "West Bengal", "Maharashtra / Goa", "Tamil Nadu / Puducherry"]
+DEMOGRAPHICS = ["M 22-40 ABCDE", "NCCS All 15+", "F 22-40 AB", "CS 2+"]
+# (rows, columns) of filler appended to Program Performance: typical, large and very large inputs
+SHEET_SIZES = [(0, 0), (200, 20), (2000, 40)]
+
+def reference_channels(path=ER_CPRP_FILE):
+    """(regular, HD or None) channel pairs from the ER sheet; HD is set when "<name> HD" also exists."""
+    names = [str(name).strip() for name in pd.read_excel(path, sheet_name="ER Channels")["Channels"].dropna()]
+    known = set(names)
+    regular = [name for name in names if not name.endswith(" HD")]
+    return [(name, f"{name} HD" if f"{name} HD" in known else None) for name in regular]
+
+def input_variants(count, seed=0):
+    """``count`` deterministic parameter sets covering channels, HD/no HD, date formats and sheet sizes."""
+    rng = random.Random(seed)
+    channels = reference_channels()
+    with_hd = [pair for pair in channels if pair[1]]
+    without_hd = [pair for pair in channels if not pair[1]]
+    variants = []
+    for index in range(count):
+        regular, hd = rng.choice(with_hd if index % 2 == 0 or not without_hd else without_hd)
+        start = datetime(2024, 1, 6) + timedelta(weeks=rng.randrange(0, 80))
+        first_week = int(f"{rng.choice([2023, 2024])}{rng.randrange(1, 40):02d}")
+        variants.append({
+            "index": index,
+            "program": rng.choice(PROGRAMS),
+            "region": rng.choice(REGIONS),
+            "demographic": rng.choice(DEMOGRAPHICS),
+            "channel_regular": regular,
+            "channel_hd": hd,
+            # Time period as a single week (int) or a "start-end" range string
+            "time_period": first_week if index % 3 else f"{first_week}-{first_week + rng.randrange(1, 8)}",
+            # Campaign start as a real date cell or the "%d %B %Y" text mbs also accepts
+            "start_date": start if index % 4 else start.strftime("%d %B %Y"),
+            "weeks": rng.randrange(1, 30),
+            "sheet_size": SHEET_SIZES[index % len(SHEET_SIZES)],
+        })
+    return variants
+
+def build_input_a(variant, template=SAMPLE_INPUT_A):
+    """A Non Cricket Input workbook (bytes) for one parameter set."""
+    wb = load_workbook(template)
+    details = wb[PROPERTY_DETAILS]
+    details["B1"] = variant["program"]
+    details["B8"] = variant["start_date"]
+    details["B14"] = variant["weeks"]
+    details["B36"] = variant["demographic"]
+    details["B37"] = variant["region"]
+    details["B45"] = variant["time_period"]
+
+    platform = wb[CHANNEL_PLATFORM]
+    platform["C5"] = variant["channel_regular"]
+    platform["C6"] = variant["channel_hd"]
+
+    rows, columns = variant["sheet_size"]
+    performance = wb[PROGRAM_PERFORMANCE]
+    first_row = performance.max_row + 2
+    for row in range(first_row, first_row + rows):
+        for column in range(1, columns + 1):
+            performance.cell(row=row, column=column, value=round((row * 31 + column * 7) % 1000 / 10, 1))
+
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def generate_inputs(count, seed=0):
+    """[(variant, input_a bytes, input_b bytes)]; input_b is the sample TVR Output workbook."""
+    with open(SAMPLE_INPUT_B, "rb") as f:
+        input_b = f.read()
+    return [(variant, build_input_a(variant), input_b) for variant in input_variants(count, seed)]
+
+class StubTVRSource(TVRSource):
+    """Deterministic TVRs per channel/region with a fixed delay standing in for the SQL round trip."""
+
+    name = "stub"
+
+    def __init__(self, latency_seconds=0.0):
+        self.latency_seconds = latency_seconds
+
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        rows = []
+        for channel in split_channels(channels):
+            digest = hashlib.sha256(f"{channel}|{program}|{region}|{demographic}".encode("utf-8")).digest()
+            rows.append({"Channel": channel, "TVRs": round(0.1 + digest[0] / 64, 2)})
+        return pd.DataFrame(rows, columns=["Channel", "TVRs"])
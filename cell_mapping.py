@@ -0,0 +1,110 @@
+import pandas as pd
+import logging
+import re
+from collections import namedtuple
+
+from openpyxl.utils import column_index_from_string
+
+logger = logging.getLogger(__name__)
+
+_CELL_RE = re.compile(r"^([A-Z]{1,3})([1-9][0-9]*)$")
+
+# Source kinds for a write: a named value, a literal, or an expression over named values
+Value = namedtuple("Value", "name")
+Const = namedtuple("Const", "value")
+Expr = namedtuple("Expr", "func names")
+
+Read = namedtuple("Read", "name sheet row col default")
+Write = namedtuple("Write", "sheet cell row col source")
+WritePlan = namedtuple("WritePlan", "reads writes names")
+
+def expr(func, *names):
+    """Expression source: ``func`` is called with the values of ``names`` in order."""
+    return Expr(func, names)
+
+def split_cell(cell_ref):
+    """Split an A1 reference into 1-based (row, column), raising ValueError if malformed."""
+    match = _CELL_RE.match(cell_ref)
+    if not match:
+        raise ValueError(f"Invalid cell reference '{cell_ref}'")
+    return int(match.group(2)), column_index_from_string(match.group(1))
+
+def _source_names(source):
+    if isinstance(source, Value):
+        return (source.name,)
+    if isinstance(source, Expr):
+        return source.names
+    if isinstance(source, Const):
+        return ()
+    raise ValueError(f"Unknown write source {source!r}")
+
+def compile_plan(reads, writes, derived=()):
+    """Validate a mapping spec and compile it into a ``WritePlan``.
+
+    ``reads`` maps value name -> (input sheet, A1 cell, default). ``writes`` is a
+    list of (target sheet index, [A1 cells], source). ``derived`` names values
+    the caller computes itself (dates, reference lookups, TVRs). Reads are
+    deduplicated by cell and writes are ordered by sheet, row and column so the
+    plan can be applied in one pass.
+    """
+    compiled_reads = {}
+    for name, (sheet, cell_ref, default) in reads.items():
+        row, col = split_cell(cell_ref)
+        compiled_reads[name] = Read(name, sheet, row - 1, col - 1, default)
+
+    known = set(compiled_reads) | set(derived)
+    compiled_writes = {}
+    for sheet, cells, source in writes:
+        missing = [name for name in _source_names(source) if name not in known]
+        if missing:
+            raise ValueError(f"Write to {cells} uses unknown values: {', '.join(missing)}")
+        for cell_ref in cells:
+            row, col = split_cell(cell_ref)
+            if (sheet, cell_ref) in compiled_writes:
+                raise ValueError(f"Cell {cell_ref} on sheet {sheet} is written more than once")
+            compiled_writes[(sheet, cell_ref)] = Write(sheet, cell_ref, row, col, source)
+
+    ordered = sorted(compiled_writes.values(), key=lambda w: (w.sheet, w.row, w.col))
+    return WritePlan(
+        reads=list(compiled_reads.values()),
+        writes=ordered,
+        names=frozenset(known),
+    )
+
+def read_values(plan, sheets, values=None):
+    """Read every source cell of ``plan`` once from the parsed input ``sheets``."""
+    values = {} if values is None else values
+    cache = {}
+    for read in plan.reads:
+        key = (read.sheet, read.row, read.col)
+        if key not in cache:
+            df = sheets[read.sheet]
+            try:
+                cache[key] = df.iloc[read.row, read.col]
+            except IndexError:
+                logger.warning(f"Warning: Index [{read.row},{read.col}] out of bounds for dataframe with shape {df.shape}")
+                cache[key] = None
+        value = cache[key]
+        values[read.name] = read.default if value is None or pd.isna(value) else value
+    return values
+
+def resolve(source, values):
+    if isinstance(source, Value):
+        return values[source.name]
+    if isinstance(source, Const):
+        return source.value
+    return source.func(*(values[name] for name in source.names))
+
+def collect_writes(plan, values):
+    """Resolve ``plan`` to a list of (sheet index, A1 cell, value) in write order."""
+    return [(write.sheet, write.cell, resolve(write.source, values)) for write in plan.writes]
+
+def apply_plan(plan, worksheets, anchors, values):
+    """Write every cell in ``plan`` in sheet order.
+
+    ``worksheets`` and ``anchors`` are indexed by the plan's sheet index; each
+    anchors entry is the cell -> merged-anchor map for that sheet.
+    """
+    for sheet, cell, value in collect_writes(plan, values):
+        cell_ref = anchors[sheet].get(cell, cell)
+        worksheets[sheet][cell_ref] = value
@@ -0,0 +1,119 @@
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Diagnostics records (e.g. the TVRs used for each one-pager) written as JSON lines
+DIAGNOSTICS_ENABLED = os.environ.get("DIAGNOSTICS_ENABLED", "1") != "0"
+DIAGNOSTICS_DIR = os.environ.get("DIAGNOSTICS_DIR", os.path.join(os.getcwd(), "diagnostics"))
+DIAGNOSTICS_MAX_FILE_BYTES = int(os.environ.get("DIAGNOSTICS_MAX_FILE_BYTES", str(5 * 1024 * 1024)))
+DIAGNOSTICS_RETENTION_DAYS = int(os.environ.get("DIAGNOSTICS_RETENTION_DAYS", "14"))
+DIAGNOSTICS_MAX_FILES = int(os.environ.get("DIAGNOSTICS_MAX_FILES", "50"))
+DIAGNOSTICS_QUEUE_SIZE = int(os.environ.get("DIAGNOSTICS_QUEUE_SIZE", "1000"))
+
+def _json_default(value):
+    # numpy scalars, datetimes and anything else pandas hands us
+    if hasattr(value, "item"):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+class DiagnosticsSink:
+    """Non-blocking JSON-lines writer for audit/diagnostic records.
+
+    ``record`` only enqueues; a daemon thread appends to
+    ``<kind>_<YYYYMMDD>_<part>.jsonl`` files, starts a new part when a file
+    exceeds ``max_file_bytes`` and deletes files past the retention limits.
+    Records are dropped (and counted) rather than blocking when the queue is full.
+    """
+
+    def __init__(self, directory=DIAGNOSTICS_DIR, enabled=DIAGNOSTICS_ENABLED,
+                 max_file_bytes=DIAGNOSTICS_MAX_FILE_BYTES, retention_days=DIAGNOSTICS_RETENTION_DAYS,
+                 max_files=DIAGNOSTICS_MAX_FILES, queue_size=DIAGNOSTICS_QUEUE_SIZE):
+        self.directory = directory
+        self.enabled = enabled
+        self.max_file_bytes = max_file_bytes
+        self.retention_days = retention_days
+        self.max_files = max_files
+        self.stats = {"written": 0, "dropped": 0, "errors": 0}
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, kind, payload):
+        """Queue one record; never blocks the caller."""
+        if not self.enabled:
+            return False
+        self._ensure_started()
+        entry = {"timestamp": datetime.now().isoformat(timespec="seconds"), "kind": kind, **payload}
+        try:
+            self._queue.put_nowait(entry)
+            return True
+        except queue.Full:
+            self.stats["dropped"] += 1
+            return False
+
+    def flush(self, timeout=5):
+        """Wait until queued records are on disk (tests, shutdown)."""
+        deadline = time.time() + timeout
+        while self._queue.unfinished_tasks and time.time() < deadline:
+            time.sleep(0.01)
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="diagnostics-sink", daemon=True)
+                self._thread.start()
+
+    def _work(self):
+        while True:
+            entry = self._queue.get()
+            try:
+                self._write(entry)
+                self.stats["written"] += 1
+            except Exception:
+                self.stats["errors"] += 1
+                logger.exception("Failed to write diagnostics record")
+            finally:
+                self._queue.task_done()
+
+    def _path_for(self, kind):
+        day = datetime.now().strftime("%Y%m%d")
+        part = 0
+        while True:
+            path = os.path.join(self.directory, f"{kind}_{day}_{part}.jsonl")
+            if not os.path.exists(path) or os.path.getsize(path) < self.max_file_bytes:
+                return path, not os.path.exists(path)
+            part += 1
+
+    def _write(self, entry):
+        os.makedirs(self.directory, exist_ok=True)
+        path, is_new = self._path_for(entry["kind"])
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, default=_json_default) + "\n")
+        if is_new:
+            self._apply_retention()
+
+    def _apply_retention(self):
+        files = sorted(glob.glob(os.path.join(self.directory, "*.jsonl")), key=os.path.getmtime)
+        cutoff = time.time() - self.retention_days * 86400
+        for index, path in enumerate(files):
+            if os.path.getmtime(path) < cutoff or index < len(files) - self.max_files:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+diagnostics_sink = DiagnosticsSink()
+register_stats("onepager_diagnostics_records_total", "Diagnostics records written, dropped or failed.", diagnostics_sink.stats, "result")
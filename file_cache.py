@@ -0,0 +1,41 @@
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+def file_version(path):
+    """(mtime in ns, size) of ``path``; changes whenever the file is edited or replaced."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+class VersionedCache:
+    """Objects built from files, loaded once per worker and reloaded when the file changes.
+
+    ``loader(path, version)`` builds the object; it runs under a lock, at most
+    once per path and file version, so concurrent first requests share one
+    load. Later lookups of an unchanged file only ``stat`` it.
+    """
+
+    def __init__(self, loader, description):
+        self.loader = loader
+        self.description = description
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, path):
+        version = file_version(path)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != version:
+                logger.info(f"Loading {self.description} from {path}")
+                entry = (version, self.loader(path, version))
+                self._entries[path] = entry
+        return entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
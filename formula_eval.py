@@ -0,0 +1,382 @@
+import logging
+import re
+from functools import lru_cache
+
+from openpyxl import load_workbook
+from openpyxl.utils.cell import range_boundaries, get_column_letter
+
+from file_cache import VersionedCache
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<string>"(?:[^"]|"")*")
+  | (?P<func>[A-Z][A-Z0-9.]*)\(
+  | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][\w.]*)!)?\$?[A-Z]{1,3}\$?\d+(?::\$?[A-Z]{1,3}\$?\d+)?)
+  | (?P<bool>TRUE|FALSE)\b
+  | (?P<op><>|<=|>=|[-+*/^&%(),=<>])
+)""", re.X)
+
+class ExcelError(str):
+    """An Excel error value such as ``#DIV/0!``; propagates through every operation."""
+
+DIV0 = ExcelError("#DIV/0!")
+VALUE = ExcelError("#VALUE!")
+NAME = ExcelError("#NAME?")
+REF = ExcelError("#REF!")
+
+class FormulaSyntaxError(ValueError):
+    """A formula the parser does not understand."""
+
+def _tokenize(formula):
+    tokens = []
+    pos = 0
+    formula = formula.rstrip()
+    while pos < len(formula):
+        match = _TOKEN_RE.match(formula, pos)
+        if not match or match.end() == pos:
+            raise FormulaSyntaxError(f"Cannot parse formula at '{formula[pos:]}'")
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+        pos = match.end()
+    return tokens
+
+def _split_ref(text):
+    sheet = None
+    if "!" in text:
+        sheet, text = text.rsplit("!", 1)
+        if sheet.startswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+    return sheet, text.replace("$", "")
+
+class _Parser:
+    # Excel precedence, lowest first: comparison, &, + -, * /, ^, %, unary minus
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value):
+            raise FormulaSyntaxError(f"Expected '{value}'" if value else "Unexpected end of formula")
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        node = self.comparison()
+        if self.pos != len(self.tokens):
+            raise FormulaSyntaxError(f"Unexpected '{self.peek()[1]}'")
+        return node
+
+    def _binary(self, operators, operand):
+        node = operand()
+        while self.peek()[0] == "op" and self.peek()[1] in operators:
+            op = self.take()[1]
+            node = ("bin", op, node, operand())
+        return node
+
+    def comparison(self):
+        return self._binary(("=", "<>", "<", ">", "<=", ">="), self.concat)
+
+    def concat(self):
+        return self._binary(("&",), self.additive)
+
+    def additive(self):
+        return self._binary(("+", "-"), self.multiplicative)
+
+    def multiplicative(self):
+        return self._binary(("*", "/"), self.power)
+
+    def power(self):
+        return self._binary(("^",), self.percent)
+
+    def percent(self):
+        node = self.unary()
+        while self.peek() == ("op", "%"):
+            self.take()
+            node = ("pct", node)
+        return node
+
+    def unary(self):
+        if self.peek() in (("op", "-"), ("op", "+")):
+            op = self.take()[1]
+            node = self.unary()
+            return ("neg", node) if op == "-" else node
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == "number":
+            return ("num", float(text))
+        if kind == "string":
+            return ("str", text[1:-1].replace('""', '"'))
+        if kind == "bool":
+            return ("bool", text == "TRUE")
+        if kind == "ref":
+            sheet, ref = _split_ref(text)
+            if ":" in ref:
+                return ("range", sheet, ref)
+            return ("ref", sheet, ref)
+        if kind == "func":
+            args = []
+            if self.peek() != ("op", ")"):
+                args.append(self.comparison())
+                while self.peek() == ("op", ","):
+                    self.take()
+                    args.append(self.comparison())
+            self.take(")")
+            return ("fn", text, args)
+        if (kind, text) == ("op", "("):
+            node = self.comparison()
+            self.take(")")
+            return node
+        raise FormulaSyntaxError(f"Unexpected '{text}'")
+
+@lru_cache(maxsize=1024)
+def parse_formula(formula):
+    """Parse ``=...`` into a small tuple AST (cached per formula text)."""
+    return _Parser(_tokenize(formula[1:] if formula.startswith("=") else formula)).parse()
+
+def _number(value):
+    """Excel's coercion of a scalar operand to a number."""
+    if isinstance(value, ExcelError):
+        return value
+    if value is None or value == "":
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if hasattr(value, "item"):  # numpy scalar
+        return float(value.item())
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return VALUE
+
+def _text(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def _numbers_in(values):
+    # Ranges contribute only real numbers, like SUM in Excel; errors still propagate
+    for value in values:
+        if isinstance(value, ExcelError):
+            yield value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield float(value)
+        elif hasattr(value, "item") and not isinstance(value, str):
+            yield float(value.item())
+
+class WorkbookModel:
+    """Cell values and formulas of a workbook, indexed by sheet position."""
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        wb = load_workbook(path)
+        self.titles = list(wb.sheetnames)
+        self.cells = []
+        self.anchors = []
+        for ws in wb.worksheets:
+            self.cells.append({cell.coordinate: cell.value for row in ws.iter_rows() for cell in row if cell.value is not None})
+            anchors = {}
+            for merged_range in ws.merged_cells.ranges:
+                anchor = merged_range.start_cell.coordinate
+                for row, col in merged_range.cells:
+                    anchors[f"{get_column_letter(col)}{row}"] = anchor
+            self.anchors.append(anchors)
+
+_models = VersionedCache(WorkbookModel, "formula model")
+
+def load_model(path):
+    """Workbook model for ``path``, loaded once per worker and reloaded when the file changes."""
+    return _models.get(path)
+
+class Evaluator:
+    """Evaluates formulas over a ``WorkbookModel`` with per-request writes on top.
+
+    ``writes`` are (sheet index, A1 cell, value) as produced by
+    ``cell_mapping.collect_writes``; merged cells are redirected to their anchor.
+    Results are numbers, strings, booleans or ``ExcelError`` values.
+    """
+
+    def __init__(self, model, writes=()):
+        self.model = model
+        self.overlay = [dict() for _ in model.titles]
+        for sheet, cell_ref, value in writes:
+            cell_ref = model.anchors[sheet].get(cell_ref, cell_ref)
+            self.overlay[sheet][cell_ref] = value
+        self._values = {}
+        self._active = set()
+
+    def raw(self, sheet, cell_ref):
+        overlay = self.overlay[sheet]
+        if cell_ref in overlay:
+            return overlay[cell_ref]
+        return self.model.cells[sheet].get(cell_ref)
+
+    def is_formula(self, sheet, cell_ref):
+        value = self.raw(sheet, cell_ref)
+        return isinstance(value, str) and value.startswith("=") and len(value) > 1
+
+    def value(self, sheet, cell_ref):
+        """Computed value of one cell; formulas are evaluated once and memoised."""
+        key = (sheet, cell_ref)
+        if key in self._values:
+            return self._values[key]
+        raw = self.raw(sheet, cell_ref)
+        if not (isinstance(raw, str) and raw.startswith("=") and len(raw) > 1):
+            if raw is not None and not isinstance(raw, (str, int, float, bool)):
+                raw = raw.item() if hasattr(raw, "item") else raw
+            return raw
+        if key in self._active:
+            logger.warning(f"Circular reference at {self.model.titles[sheet]}!{cell_ref}")
+            return REF
+        self._active.add(key)
+        try:
+            result = self._eval(parse_formula(raw), sheet)
+        except FormulaSyntaxError as e:
+            logger.warning(f"Cannot evaluate {self.model.titles[sheet]}!{cell_ref} {raw}: {e}")
+            result = NAME
+        finally:
+            self._active.discard(key)
+        if isinstance(result, list):
+            result = VALUE
+        elif result is None:
+            result = 0.0
+        if isinstance(result, float) and result.is_integer():
+            result = int(result)
+        self._values[key] = result
+        return result
+
+    def formula_values(self, sheets):
+        """{(sheet index, A1 cell): computed value} for every formula cell on ``sheets``."""
+        results = {}
+        for sheet in sheets:
+            refs = set(self.model.cells[sheet]) | set(self.overlay[sheet])
+            for cell_ref in refs:
+                if self.is_formula(sheet, cell_ref):
+                    results[(sheet, cell_ref)] = self.value(sheet, cell_ref)
+        return results
+
+    def _sheet_index(self, name, current):
+        if name is None:
+            return current
+        try:
+            return self.model.titles.index(name)
+        except ValueError:
+            return None
+
+    def _eval(self, node, sheet):
+        kind = node[0]
+        if kind in ("num", "str", "bool"):
+            return node[1]
+        if kind == "ref":
+            index = self._sheet_index(node[1], sheet)
+            return REF if index is None else self.value(index, node[2])
+        if kind == "range":
+            index = self._sheet_index(node[1], sheet)
+            if index is None:
+                return REF
+            min_col, min_row, max_col, max_row = range_boundaries(node[2])
+            return [self.value(index, f"{get_column_letter(col)}{row}")
+                    for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)]
+        if kind == "neg":
+            value = _number(self._scalar(node[1], sheet))
+            return value if isinstance(value, ExcelError) else -value
+        if kind == "pct":
+            value = _number(self._scalar(node[1], sheet))
+            return value if isinstance(value, ExcelError) else value / 100
+        if kind == "bin":
+            return self._binary(node[1], self._scalar(node[2], sheet), self._scalar(node[3], sheet))
+        if kind == "fn":
+            return self._function(node[1], node[2], sheet)
+        raise FormulaSyntaxError(f"Unknown node {kind}")
+
+    def _scalar(self, node, sheet):
+        value = self._eval(node, sheet)
+        return VALUE if isinstance(value, list) else value
+
+    def _binary(self, op, left, right):
+        for value in (left, right):
+            if isinstance(value, ExcelError):
+                return value
+        if op == "&":
+            return _text(left) + _text(right)
+        if op in ("=", "<>", "<", ">", "<=", ">="):
+            if isinstance(left, str) or isinstance(right, str):
+                left, right = _text(left).lower(), _text(right).lower()
+            else:
+                left, right = _number(left), _number(right)
+            return {"=": left == right, "<>": left != right, "<": left < right,
+                    ">": left > right, "<=": left <= right, ">=": left >= right}[op]
+        left, right = _number(left), _number(right)
+        for value in (left, right):
+            if isinstance(value, ExcelError):
+                return value
+        if op == "+":
+            return left + right
+        if op == "-":
+            return left - right
+        if op == "*":
+            return left * right
+        if op == "/":
+            return DIV0 if right == 0 else left / right
+        try:
+            return float(left ** right)
+        except (OverflowError, ZeroDivisionError, TypeError):
+            return ExcelError("#NUM!")
+
+    def _arguments(self, args, sheet):
+        # Flattened numeric arguments for the aggregate functions
+        numbers = []
+        for arg in args:
+            value = self._eval(arg, sheet)
+            if isinstance(value, list):
+                numbers.extend(_numbers_in(value))
+            elif value is not None:
+                numbers.append(_number(value))
+        for value in numbers:
+            if isinstance(value, ExcelError):
+                return value
+        return numbers
+
+    def _function(self, name, args, sheet):
+        if name == "IFERROR" and len(args) == 2:
+            value = self._scalar(args[0], sheet)
+            return self._scalar(args[1], sheet) if isinstance(value, ExcelError) else value
+        if name in ("SUM", "MIN", "MAX", "AVERAGE"):
+            numbers = self._arguments(args, sheet)
+            if isinstance(numbers, ExcelError):
+                return numbers
+            if name == "SUM":
+                return float(sum(numbers))
+            if name == "AVERAGE":
+                return sum(numbers) / len(numbers) if numbers else DIV0
+            return float((min if name == "MIN" else max)(numbers)) if numbers else 0.0
+        if name in ("ABS", "ROUND") and len(args) == (1 if name == "ABS" else 2):
+            values = [_number(self._scalar(arg, sheet)) for arg in args]
+            for value in values:
+                if isinstance(value, ExcelError):
+                    return value
+            if name == "ABS":
+                return abs(values[0])
+            return _round_half_away(values[0], int(values[1]))
+        return NAME
+
+def _round_half_away(value, digits):
+    # Excel rounds halves away from zero, unlike Python's banker's rounding
+    factor = 10.0 ** digits
+    scaled = abs(value) * factor
+    rounded = float(int(scaled + 0.5)) / factor
+    return rounded if value >= 0 else -rounded
@@ -0,0 +1,54 @@
+# Gunicorn settings for the one-pager service (loaded via --config in the Dockerfile)
+import gc
+import os
+import threading
+
+# Import the app in the master so workers are forked with it already loaded ("0" turns this off)
+preload_app = os.environ.get("GUNICORN_PRELOAD", "1") != "0"
+
+# Threaded workers keep /ping, /ready and job polling responsive while renders run; the
+# render/batch routes are bounded per worker by admission.py (RENDER_CONCURRENCY etc.).
+# Threads default to every lane slot (running + queued) plus headroom that lanes can never take.
+from admission import lane_capacity
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.environ.get("GUNICORN_WORKERS", "1"))
+thread_headroom = int(os.environ.get("GUNICORN_THREAD_HEADROOM", "4"))
+threads = int(os.environ.get("GUNICORN_THREADS", str(lane_capacity() + thread_headroom)))
+
+
+def on_starting(server):
+    """Check thread headroom, then pre-parse templates and reference data in the master.
+
+    Cloud Run only routes traffic once the port accepts connections, so a new
+    instance never serves a request cold; workers inherit the parsed caches
+    copy-on-write. gc.freeze keeps the collector from touching (and copying)
+    those shared pages in the workers.
+    """
+    if server.cfg.worker_class_str == "gthread" and server.cfg.threads <= lane_capacity():
+        raise RuntimeError(f"GUNICORN_THREADS={server.cfg.threads} leaves no thread for /ping and /ready: "
+                           f"the admission lanes can hold {lane_capacity()} requests. Raise the threads "
+                           f"or lower RENDER_*/BATCH_* concurrency and queue sizes.")
+    if server.cfg.workers > 1:
+        server.log.warning("GUNICORN_WORKERS > 1: /jobs state lives in each worker's memory, so a poll "
+                           "can reach a worker that never saw the job and get a 404")
+    if not server.cfg.preload_app or os.environ.get("WARM_UP_ON_START", "1") == "0":
+        return
+    import warmup
+    from app import SKELETON_FILE
+    warmup.warm_up(SKELETON_FILE)
+    server.log.info(f"Warm-up timings: {warmup.timings}")
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Warm the TVR source (DB pool or local extract) in each worker without delaying its boot."""
+    if os.environ.get("TVR_SQL_POOL_WARMUP", "2") == "0":
+        return
+    from tvr_processor import get_tvr_source
+    threading.Thread(target=lambda: get_tvr_source().warm_up(), name="tvr-source-warmup", daemon=True).start()
+
+
+def worker_exit(server, worker):
+    from tvr_processor import dispose_engine
+    dispose_engine()
@@ -0,0 +1,97 @@
+import pandas as pd
+import os
+from io import BytesIO
+
+from openpyxl import load_workbook
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+
+# Sheets of the Non Cricket Input workbook used by mbs and tvr_processor
+PROPERTY_DETAILS = "Property Details"
+CHANNEL_PLATFORM = "Channel & Platform Details"
+PROGRAM_PERFORMANCE = "Program Performance"
+INPUT_SHEETS = [PROPERTY_DETAILS, CHANNEL_PLATFORM, PROGRAM_PERFORMANCE]
+
+# "sparse" streams only the addressed cells; "pandas" parses whole sheets with pd.read_excel
+INPUT_READER = os.environ.get("INPUT_READER", "sparse")
+
+def read_input(source):
+    """Normalise a workbook input to either a file path or raw bytes.
+
+    Accepts a path, ``bytes``/``bytearray`` or a binary file-like object, so
+    callers can pass uploads straight through without writing them to disk.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        return source.read()
+    return source
+
+def excel_source(source):
+    """Return something ``pd.read_excel``/``load_workbook`` can open, fresh for each read."""
+    if isinstance(source, bytes):
+        return BytesIO(source)
+    return source
+
+def load_input_sheets(source, cells=None, reader=None):
+    """Parse every sheet the pipeline needs from the Non Cricket Input workbook in one open.
+
+    Returns a dict of header-less DataFrames keyed by sheet name, which is the
+    shared input model handed to both ``process_excel_data`` and ``extract_tvr_data``.
+    When ``cells`` ({sheet: [A1 refs]}) is given and the sparse reader is
+    selected, only the block up to the last addressed row/column is read.
+    """
+    source = read_input(source)
+    reader = reader or INPUT_READER
+    if cells is None or reader == "pandas":
+        return pd.read_excel(excel_source(source), sheet_name=INPUT_SHEETS, header=None)
+    if reader != "sparse":
+        raise ValueError(f"Unknown INPUT_READER '{reader}' (expected sparse or pandas)")
+    return read_sparse_sheets(source, cells)
+
+def cell_bounds(cells):
+    """{sheet: [A1 refs]} -> {sheet: (last row, last column)}, both 1-based."""
+    bounds = {}
+    for sheet, refs in cells.items():
+        max_row = max_col = 0
+        for cell_ref in refs:
+            column, row = coordinate_from_string(cell_ref)
+            max_row = max(max_row, row)
+            max_col = max(max_col, column_index_from_string(column))
+        bounds[sheet] = (max_row, max_col)
+    return bounds
+
+def _convert_cell(value):
+    # Same normalisation pandas applies to openpyxl values: blanks become NaN, whole floats become ints
+    if value is None:
+        return float("nan")
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def read_sparse_sheets(source, cells):
+    """Stream just the addressed cells of each input sheet in openpyxl read-only mode.
+
+    Each sheet is read row by row up to its last addressed row and column and
+    then abandoned, so cost no longer grows with the size of the sheet. The
+    result has the same shape contract as the pandas path for those cells.
+    """
+    bounds = cell_bounds(cells)
+    wb = load_workbook(excel_source(source), read_only=True, data_only=True)
+    try:
+        sheets = {}
+        for sheet in INPUT_SHEETS:
+            if sheet not in wb.sheetnames:
+                raise ValueError(f"Worksheet named '{sheet}' not found")
+            max_row, max_col = bounds.get(sheet, (0, 0))
+            rows = []
+            if max_row and max_col:
+                for row in wb[sheet].iter_rows(min_row=1, max_row=max_row, max_col=max_col, values_only=True):
+                    rows.append([_convert_cell(value) for value in row] + [float("nan")] * (max_col - len(row)))
+            sheets[sheet] = pd.DataFrame(rows)
+        return sheets
+    finally:
+        wb.close()
+
+def is_input_sheets(value):
+    """True if ``value`` is an already parsed input model from ``load_input_sheets``."""
+    return isinstance(value, dict) and all(name in value for name in INPUT_SHEETS)
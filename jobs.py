@@ -0,0 +1,135 @@
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+
+from admission import Saturated
+from structured_logging import in_context
+
+logger = logging.getLogger(__name__)
+
+# Worker threads executing jobs, and how many jobs may wait behind them
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "20"))
+# Finished jobs (and their output) are dropped after this many seconds, or sooner when more
+# than JOB_MAX_RETAINED have finished (oldest first)
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", "3600"))
+JOB_MAX_RETAINED = int(os.environ.get("JOB_MAX_RETAINED", "50"))
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+class QueueFull(Exception):
+    """Raised by ``submit`` when the bounded job queue has no room."""
+
+class JobRunner:
+    """Bounded in-process job queue for long-running one-pager renders.
+
+    Jobs live in this process's memory, so a poll only finds a job on the
+    process that accepted it: run one gunicorn worker per instance and keep
+    clients on one instance (session affinity, or a single instance), see
+    cloudbuild.yaml. When ``lane`` is given, each job holds a slot in it while
+    it renders, so background jobs count against the same concurrency limit
+    as synchronous renders; a job waits (still queued) until a slot frees up.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_size=JOB_QUEUE_SIZE, retention=JOB_RETENTION_SECONDS,
+                 max_retained=JOB_MAX_RETAINED, lane=None):
+        self.workers = workers
+        self.retention = retention
+        self.max_retained = max_retained
+        self.lane = lane
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args):
+        """Queue ``func(*args)`` and return its job id, or raise QueueFull."""
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "status": QUEUED, "submitted": time.time(),
+               "started": None, "finished": None, "result": None, "error": None}
+        with self._lock:
+            self._ensure_started()
+            try:
+                self._queue.put_nowait((job_id, in_context(func), args))
+            except queue.Full:
+                raise QueueFull(f"Job queue is full ({self._queue.maxsize} waiting)")
+            self._jobs[job_id] = job
+        logger.info(f"Job {job_id} queued")
+        return job_id
+
+    def get(self, job_id):
+        """Return a copy of the job record, or None if unknown or expired."""
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _work(self):
+        while True:
+            job_id, func, args = self._queue.get()
+            with self._lock:
+                job = self._jobs.get(job_id)
+            try:
+                result = self._run(job, func, args)
+                update = {"status": DONE, "result": result}
+                logger.info(f"Job {job_id} finished")
+            except Exception as e:
+                logger.exception(f"Job {job_id} failed")
+                update = {"status": FAILED, "error": str(e)}
+            with self._lock:
+                if job is not None:
+                    job.update(update, finished=time.time())
+            self._queue.task_done()
+            self._purge_expired()
+
+    def _run(self, job, func, args):
+        """Run one job, inside ``lane`` when set, waiting out saturation instead of failing."""
+        while True:
+            try:
+                if self.lane is None:
+                    self._mark_running(job)
+                    return func(*args)
+                with self.lane.admit():
+                    self._mark_running(job)
+                    return func(*args)
+            except Saturated as e:
+                logger.info(f"Job {job['id'] if job else '?'} waiting for a {self.lane.name} slot: {e}")
+                time.sleep(e.retry_after)
+
+    def _mark_running(self, job):
+        with self._lock:
+            if job is not None:
+                job["status"] = RUNNING
+                job["started"] = time.time()
+
+    def _purge_expired(self):
+        cutoff = time.time() - self.retention
+        with self._lock:
+            finished = sorted((job["finished"], job_id) for job_id, job in self._jobs.items()
+                              if job["finished"] is not None)
+            excess = max(0, len(finished) - self.max_retained)
+            for index, (finished_at, job_id) in enumerate(finished):
+                if index < excess or finished_at < cutoff:
+                    del self._jobs[job_id]
+
+def job_status(job):
+    """Public view of a job record (without the output payload)."""
+    return {key: job[key] for key in ("id", "status", "submitted", "started", "finished", "error")}
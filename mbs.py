@@ -1,368 +1,450 @@
-import pandas as pd
-from openpyxl import load_workbook
 from datetime import datetime, timedelta
 import logging
 import os
+import zipfile
+from io import BytesIO
+from concurrent.futures import Future, ThreadPoolExecutor
 
-from tvr_processor import extract_tvr_data
+from input_workbook import (
+    PROPERTY_DETAILS, CHANNEL_PLATFORM, PROGRAM_PERFORMANCE,
+    read_input, excel_source, load_input_sheets, is_input_sheets,
+)
+from cell_mapping import Value, Const, expr, compile_plan, read_values, collect_writes, apply_plan
+from skeleton_template import acquire_template, release_template
+from xml_writer import get_xml_template, UnsupportedValue
+from formula_eval import Evaluator, load_model
+from reference_data import ER_CPRP_FILENAME, get_reference, lookup
+from output_cache import output_cache, input_key
+from file_cache import file_version
+from metrics import timed_stage, payload_bytes
+from structured_logging import in_context
+from tvr_processor import extract_tvr_data, TVR_INPUT_CELLS
 
 logger = logging.getLogger(__name__)
 
-def safe_get_cell(df, row, col, default=0):
-    try:
-        value = df.iloc[row, col]
-        return value if not pd.isna(value) else default
-    except IndexError:
-        logger.warning(f"Warning: Index [{row},{col}] out of bounds for dataframe with shape {df.shape}")
-        return default
-
-def safe_set_cell(ws, cell_ref, value):
-    for merged_range in ws.merged_cells.ranges:
-        if cell_ref in merged_range:
-            cell_ref = merged_range.start_cell.coordinate
-            break
-    ws[cell_ref] = value
-    return cell_ref
-
-def process_excel_data(input_a_path, input_b_path, skeleton_path, output_path):
+# Background threads that fetch TVRs while the skeleton is being filled
+TVR_PREFETCH_WORKERS = int(os.environ.get("TVR_PREFETCH_WORKERS", "4"))
+_tvr_executor = ThreadPoolExecutor(max_workers=TVR_PREFETCH_WORKERS, thread_name_prefix="tvr-prefetch")
+
+# Compute formula results in-process and store them as cached values (XML writer only:
+# openpyxl cannot save cached results, so its outputs rely on Excel recalculating on open)
+EVALUATE_FORMULAS = os.environ.get("EVALUATE_FORMULAS", "1") != "0"
+# "xml" patches the skeleton's sheet XML directly; "openpyxl" fills a pooled workbook object.
+# Defaults to "xml" whenever formulas are evaluated, so the computed values actually reach the output
+OUTPUT_WRITER = os.environ.get("OUTPUT_WRITER", "xml" if EVALUATE_FORMULAS else "openpyxl")
+if EVALUATE_FORMULAS and OUTPUT_WRITER != "xml":
+    logger.warning(f"EVALUATE_FORMULAS is on but OUTPUT_WRITER={OUTPUT_WRITER}: formula results are only "
+                   f"stored by the xml writer, so outputs will open without cached values")
+
+# === ONE-PAGER MAPPING SPEC ===
+# Target sheets, by position in the skeleton workbook
+SUMMARY = 0
+ONE_PAGER = 1
+
+# value name -> (input sheet, cell, default when blank or out of range)
+ONE_PAGER_READS = {
+    "prop_b1": (PROPERTY_DETAILS, "B1", ""),
+    "prop_b3": (PROPERTY_DETAILS, "B3", ""),
+    "prop_b4": (PROPERTY_DETAILS, "B4", ""),
+    "prop_b7": (PROPERTY_DETAILS, "B7", ""),
+    "prop_b8": (PROPERTY_DETAILS, "B8", ""),
+    "prop_b9": (PROPERTY_DETAILS, "B9", ""),
+    "prop_b10": (PROPERTY_DETAILS, "B10", ""),
+    "prop_b11": (PROPERTY_DETAILS, "B11", ""),
+    "prop_b12": (PROPERTY_DETAILS, "B12", 2),
+    "prop_b13": (PROPERTY_DETAILS, "B13", 1),
+    "prop_b14": (PROPERTY_DETAILS, "B14", ""),
+    "prop_b20": (PROPERTY_DETAILS, "B20", ""),
+    "prop_b21": (PROPERTY_DETAILS, "B21", ""),
+    "prop_b22": (PROPERTY_DETAILS, "B22", ""),
+    "prop_b23": (PROPERTY_DETAILS, "B23", ""),
+    "prop_b26": (PROPERTY_DETAILS, "B26", ""),
+    "prop_b27": (PROPERTY_DETAILS, "B27", ""),
+    "prop_b28": (PROPERTY_DETAILS, "B28", ""),
+    "prop_a29": (PROPERTY_DETAILS, "A29", ""),
+    "prop_b29": (PROPERTY_DETAILS, "B29", ""),
+    "prop_b32": (PROPERTY_DETAILS, "B32", 0),
+
+    "channel_b5": (CHANNEL_PLATFORM, "B5", ""),
+    "channel_c5": (CHANNEL_PLATFORM, "C5", ""),
+    "channel_c6": (CHANNEL_PLATFORM, "C6", ""),
+    "channel_c9": (CHANNEL_PLATFORM, "C9", ""),
+    "channel_e9": (CHANNEL_PLATFORM, "E9", 0),
+    "channel_e10": (CHANNEL_PLATFORM, "E10", 0),
+    "channel_g5": (CHANNEL_PLATFORM, "G5", 0),
+    "channel_g6": (CHANNEL_PLATFORM, "G6", 0),
+    "channel_g7": (CHANNEL_PLATFORM, "G7", 0),
+    "channel_g8": (CHANNEL_PLATFORM, "G8", 0),
+    "channel_o5": (CHANNEL_PLATFORM, "O5", 0),
+    "channel_o6": (CHANNEL_PLATFORM, "O6", 0),
+    "channel_o7": (CHANNEL_PLATFORM, "O7", 0),
+    "channel_o8": (CHANNEL_PLATFORM, "O8", 0),
+    "channel_j9": (CHANNEL_PLATFORM, "J9", 0),
+    "channel_j10": (CHANNEL_PLATFORM, "J10", 0),
+    "channel_k9": (CHANNEL_PLATFORM, "K9", 0),
+    "channel_k10": (CHANNEL_PLATFORM, "K10", 0),
+    "channel_l9": (CHANNEL_PLATFORM, "L9", 0),
+    "channel_l10": (CHANNEL_PLATFORM, "L10", 0),
+
+    "program_l11": (PROGRAM_PERFORMANCE, "L11", 0),
+    "program_l12": (PROGRAM_PERFORMANCE, "L12", 0),
+    "program_f12": (PROGRAM_PERFORMANCE, "F12", 0),
+    "program_g12": (PROGRAM_PERFORMANCE, "G12", 0),
+}
+
+# Values process_excel_data computes before the plan is applied
+ONE_PAGER_DERIVED = [
+    "current_year", "campaign_months", "program_months",
+    "er_net_rate", "market_cprp", "all_india_cprp",
+]
+
+# (target sheet, target cells, source)
+ONE_PAGER_WRITES = [
+    # DBD One Pager-with Eval.
+    (ONE_PAGER, ["B2"], expr(lambda b1, year, b29: f"{b1} - {year} Driven By: {b29}", "prop_b1", "current_year", "prop_b29")),
+    (ONE_PAGER, ["C5"], Value("prop_b3")),
+    (ONE_PAGER, ["C10"], Value("campaign_months")),
+    (ONE_PAGER, ["D10"], Value("prop_b11")),
+    (ONE_PAGER, ["E10"], Value("prop_b7")),
+    (ONE_PAGER, ["F10"], expr(lambda b9, b10: f"{b9} - {b10}", "prop_b9", "prop_b10")),
+    (ONE_PAGER, ["D15"], Value("channel_c9")),
+    (ONE_PAGER, ["H21", "H22"], Value("program_months")),
+    (ONE_PAGER, ["C21", "C28", "C30"], Value("channel_c5")),
+    (ONE_PAGER, ["C22", "C29", "C31"], Value("channel_c6")),
+    (ONE_PAGER, ["D21", "D22", "D28", "D29", "D30", "D31", "D37", "D38"], Value("prop_b1")),
+    (ONE_PAGER, ["E21", "E22", "C37", "C38", "E37", "E38"], Value("channel_c9")),
+    (ONE_PAGER, ["G21"], Value("program_l11")),
+    (ONE_PAGER, ["G22"], Value("program_l12")),
+
+    # Rows 28-32 (Channel & Platform section)
+    (ONE_PAGER, ["E28", "E29"], expr(lambda b12: b12 - 2, "prop_b12")),
+    (ONE_PAGER, ["E30", "E31"], Value("prop_b13")),
+    (ONE_PAGER, ["F28"], Value("channel_o5")),
+    (ONE_PAGER, ["F29"], Value("channel_o6")),
+    (ONE_PAGER, ["F30"], Value("channel_o7")),
+    (ONE_PAGER, ["F31"], Value("channel_o8")),
+    (ONE_PAGER, ["G28"], Const("=F28*E28")),
+    (ONE_PAGER, ["G29"], Const("=F29*E29")),
+    (ONE_PAGER, ["G30"], Const("=F30*E30")),
+    (ONE_PAGER, ["G31"], Const("=F31*E31")),
+    (ONE_PAGER, ["G32"], Const("=SUM(G28:G31)")),
+    (ONE_PAGER, ["J28"], Const("=I28*G28/10")),
+    (ONE_PAGER, ["J29"], Const("=I29*G29/10")),
+    (ONE_PAGER, ["J30"], Const("=I30*G30/10")),
+    (ONE_PAGER, ["J31"], Const("=I31*G31/10")),
+    (ONE_PAGER, ["J32"], Const("=SUM(J28:J31)")),
+    (ONE_PAGER, ["K28", "K29", "K30", "K31"], Const("=L32/G32*10")),
+    (ONE_PAGER, ["L28", "L29", "L30", "L31"], expr(lambda b32: f"={b32}*10000000", "prop_b32")),
+    (ONE_PAGER, ["L32"], Const("=SUM(L28:L31)")),
+    (ONE_PAGER, ["M28"], Value("market_cprp")),
+    (ONE_PAGER, ["M31"], Value("er_net_rate")),
+    (ONE_PAGER, ["N28", "N29", "N30", "N31"], Value("all_india_cprp")),
+    (ONE_PAGER, ["O28"], Const("=J28*N28")),
+    (ONE_PAGER, ["O29"], Const("=J29*N29")),
+    (ONE_PAGER, ["O30"], Const("=J30*N30")),
+    (ONE_PAGER, ["O31"], Const("=J31*N31")),
+    (ONE_PAGER, ["O32"], Const("=SUM(O28:O31)")),
+
+    # Rows 37-39 (Second section)
+    (ONE_PAGER, ["F37"], Value("channel_e9")),
+    (ONE_PAGER, ["F38"], Value("channel_e10")),
+    (ONE_PAGER, ["G37"], Const("=(I38*1000000)*0.6")),  # 60% as decimal
+    (ONE_PAGER, ["G38"], Const("=(I39*1000000)*0.6")),
+    (ONE_PAGER, ["G39"], Const("=SUM(G37:G38)")),
+    (ONE_PAGER, ["H37"], Const("=(I38*1000000)*0.4")),  # 40% as decimal
+    (ONE_PAGER, ["H38"], Const("=(I39*1000000)*0.4")),
+    (ONE_PAGER, ["I37"], Value("channel_k9")),
+    (ONE_PAGER, ["I38"], Value("channel_k10")),
+    (ONE_PAGER, ["J37"], Value("channel_j9")),
+    (ONE_PAGER, ["J38"], Value("channel_j10")),
+    (ONE_PAGER, ["K37"], Value("channel_l9")),
+    (ONE_PAGER, ["K38"], Value("channel_l10")),
+    (ONE_PAGER, ["L37"], Const("=(K37*I37/1000)*10^6")),
+    (ONE_PAGER, ["L38"], Const("=(K38*I38/1000)*10^6")),
+    (ONE_PAGER, ["L39"], Const("=SUM(L37:L38)")),
+    (ONE_PAGER, ["O38", "O39"], Const("(data unavailable)")),
+
+    # Summary
+    (SUMMARY, ["B2"], expr(lambda b1, year, b29: f"{b1} - {year} Driven By {b29}", "prop_b1", "current_year", "prop_b29")),
+    (SUMMARY, ["D4"], Value("campaign_months")),
+    (SUMMARY, ["D5", "E26", "E27", "E28", "E29", "E34", "E35"], Value("prop_b1")),
+    (SUMMARY, ["D6"], Value("prop_a29")),
+    (SUMMARY, ["D7"], Value("prop_b4")),
+    (SUMMARY, ["D10"], Value("prop_b20")),
+    (SUMMARY, ["D11"], Value("prop_b23")),
+    (SUMMARY, ["H10"], Value("prop_b21")),
+    (SUMMARY, ["H11"], Value("prop_b22")),
+    (SUMMARY, ["D14"], Value("prop_b26")),
+    (SUMMARY, ["D15"], Value("prop_b29")),
+    (SUMMARY, ["H14"], Value("prop_b27")),
+    (SUMMARY, ["H15"], Value("prop_b28")),
+    (SUMMARY, ["D19"], expr(lambda b9, b10: f"{b9} - {b10} (Timing)", "prop_b9", "prop_b10")),
+    (SUMMARY, ["D20"], Const("TV Telecast - On")),
+    (SUMMARY, ["D21"], Const("Digital Telecast - On")),
+    (SUMMARY, ["C26", "C28"], Value("channel_c5")),
+    (SUMMARY, ["C27", "C29"], Value("channel_c6")),
+    (SUMMARY, ["D26", "D27"], expr(lambda b12: b12 - 2, "prop_b12")),
+    (SUMMARY, ["D28", "D29"], Value("prop_b13")),
+    (SUMMARY, ["F26"], Value("channel_g5")),
+    (SUMMARY, ["F27"], Value("channel_g6")),
+    (SUMMARY, ["F28"], Value("channel_g7")),
+    (SUMMARY, ["F29"], Value("channel_g8")),
+    (SUMMARY, ["G26", "G27", "G28", "G29"], Value("channel_b5")),
+    (SUMMARY, ["C34", "C35"], Value("channel_c9")),
+    (SUMMARY, ["D34"], Value("channel_e9")),
+    (SUMMARY, ["D35"], Value("channel_e10")),
+    (SUMMARY, ["F34"], Value("channel_j9")),
+    (SUMMARY, ["F35"], Value("channel_j10")),
+    (SUMMARY, ["G34"], Value("channel_k9")),
+    (SUMMARY, ["G35"], Value("channel_k10")),
+    (SUMMARY, ["D41"], Const("='DBD One Pager-with Eval.'!D45")),
+    (SUMMARY, ["F41"], Const("='DBD One Pager-with Eval.'!D47")),
+]
+
+# TVRs in the order extract_tvr_data returns them
+TVR_NAMES = ["tvr_region_regular", "tvr_region_hd", "tvr_india_regular", "tvr_india_hd"]
+
+TVR_WRITES = [
+    (ONE_PAGER, ["I28", "I30"], Value("tvr_region_regular")),
+    (ONE_PAGER, ["I29", "I31"], Value("tvr_region_hd")),
+    (ONE_PAGER, ["H28", "H30"], Value("tvr_india_regular")),
+    (ONE_PAGER, ["H29", "H31"], Value("tvr_india_hd")),
+]
+
+# Compiled once at import so a bad spec fails at worker start, not mid-request
+ONE_PAGER_PLAN = compile_plan(ONE_PAGER_READS, ONE_PAGER_WRITES, ONE_PAGER_DERIVED)
+TVR_PLAN = compile_plan({}, TVR_WRITES, TVR_NAMES)
+
+# === JSON SUMMARY SPEC ===
+# field -> column of the TV (rows 28-31, total 32) and CTV + Mobile (rows 37-38, total 39) tables
+TV_COLUMNS = {
+    "platform": "C", "property": "D", "episodes": "E", "fct_per_episode": "F", "total_fct": "G",
+    "tvr_all_india": "H", "tvr_region": "I", "grps": "J", "partner_er": "K", "cost": "L",
+    "benchmark_er": "M", "cprp_all_india": "N", "eval_cost": "O",
+}
+TV_ROWS, TV_TOTAL_ROW = [28, 29, 30, 31], 32
+DIGITAL_COLUMNS = {
+    "platform": "C", "property": "D", "inventory": "E", "device": "F", "sponsored_show_imps": "G",
+    "top_show_imps": "H", "estimated_imps_mn": "I", "estimated_reach_mn": "J", "eval_cpm": "K",
+    "cost": "L", "er": "M", "eval_cost": "N",
+}
+DIGITAL_ROWS, DIGITAL_TOTAL_ROW = [37, 38], 39
+# Labels only, so they are left out of the total rows
+LABEL_FIELDS = ["platform", "property", "inventory", "device"]
+TOTAL_CELLS = {
+    "tv_cost": "D45", "tv_eval_cost_cr": "E45",
+    "digital_cost": "D46", "digital_eval_cost_cr": "E46",
+    "total_cost_cr": "D47", "total_eval_cost_cr": "E47",
+}
+
+# Every input cell the pipeline touches, for the sparse input reader
+INPUT_CELLS = {}
+for _sheet, _cell, _default in ONE_PAGER_READS.values():
+    INPUT_CELLS.setdefault(_sheet, []).append(_cell)
+for _sheet, _cells in TVR_INPUT_CELLS.items():
+    INPUT_CELLS.setdefault(_sheet, []).extend(_cells)
+
+def process_excel_data(input_a, input_b, skeleton_path, output_path=None, summary=False, tvrs=None):
+    """Fill the skeleton one-pager from the two input workbooks.
+
+    ``input_a`` and ``input_b`` may be paths, bytes or file-like objects;
+    ``input_a`` may also be the sheet dict from ``load_input_sheets``. When
+    ``output_path`` is None the completed workbook is returned as bytes and
+    nothing is written to disk; otherwise it is saved to ``output_path``.
+    With ``summary=True`` no workbook is rendered and the computed figures
+    are returned as a dict (see ``one_pager_summary``). ``tvrs`` are TVRs
+    already looked up by the caller (``extract_tvr_data_bulk`` in batch mode);
+    when given, no TVR query is made for this workbook.
+    """
     logger.info(f"Process started on {datetime.now().strftime('%A, %B %d, %Y at %H:%M:%S')}")
 
+    if not is_input_sheets(input_a):
+        input_a = read_input(input_a)
+    input_b = read_input(input_b)
+
     # File checks
-    for path, name in [(input_a_path, "Non Cricket Input"), (input_b_path, "TVR Output"), (skeleton_path, "Skeleton")]:
+    for path, name in [(input_a, "Non Cricket Input"), (input_b, "TVR Output"), (skeleton_path, "Skeleton")]:
+        if isinstance(path, (bytes, dict)):
+            continue
         if not os.path.exists(path):
             error_msg = f"{name} file not found at path: {path}"
             logger.error(error_msg)
             raise FileNotFoundError(error_msg)
 
+    # Identical resubmissions are answered from the output cache before any parsing or SQL
+    er_file_path = os.path.join(os.path.dirname(skeleton_path), ER_CPRP_FILENAME)
+    cache_key = None
+    if not summary and output_cache.enabled and isinstance(input_a, bytes) and isinstance(input_b, bytes) and os.path.exists(er_file_path):
+        cache_key = input_key(input_a, input_b, file_version(skeleton_path), file_version(er_file_path),
+                              OUTPUT_WRITER, datetime.now().year)
+        cached = output_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"Output cache hit {cached['digest'][:12]} (TVRs {cached['tvrs']})")
+            return finish_output(cached["data"], output_path)
+
     try:
-        # Load data
-        property_details = pd.read_excel(input_a_path, sheet_name="Property Details", header=None)
-        channel_platform = pd.read_excel(input_a_path, sheet_name="Channel & Platform Details", header=None)
-        program_performance = pd.read_excel(input_a_path, sheet_name="Program Performance", header=None)
-        input_b = pd.read_excel(input_b_path, header=None)
+        # Load data: input_a is parsed once and shared with the TVR extraction
+        with timed_stage("load_inputs"):
+            input_sheets = input_a if is_input_sheets(input_a) else load_input_sheets(input_a, INPUT_CELLS)
+            # No cell of the TVR Output workbook is used; only check that it is an xlsx (zip) container
+            if not zipfile.is_zipfile(excel_source(input_b)):
+                raise ValueError("TVR Output workbook is not a valid .xlsx file")
     except Exception as e:
         logger.error(f"Error loading input files: {str(e)}")
         raise
 
-    wb = load_workbook(skeleton_path)
-    sheet1 = wb[wb.sheetnames[0]]
-    sheet2 = wb[wb.sheetnames[1]]
-
-    # Extract values
-    prop_b1 = safe_get_cell(property_details, 0, 1, "")
-    prop_b8 = safe_get_cell(property_details, 7, 1, "")
-    prop_b14 = safe_get_cell(property_details, 13, 1, "")
-    prop_b29 = safe_get_cell(property_details, 28, 1, "")
-    prop_a29 = safe_get_cell(property_details, 28, 0, "")
-    prop_b3 = safe_get_cell(property_details, 2, 1, "")
-    prop_b4 = safe_get_cell(property_details, 3, 1, "")
-    prop_b7 = safe_get_cell(property_details, 6, 1, "")
-    prop_b9 = safe_get_cell(property_details, 8, 1, "")
-    prop_b10 = safe_get_cell(property_details, 9, 1, "")
-    prop_b11 = safe_get_cell(property_details, 10, 1, "")
-    prop_b12 = safe_get_cell(property_details, 11, 1, 2)
-    prop_b13 = safe_get_cell(property_details, 12, 1, 1)
-    prop_b20 = safe_get_cell(property_details, 19, 1, "")
-    prop_b21 = safe_get_cell(property_details, 20, 1, "")
-    prop_b22 = safe_get_cell(property_details, 21, 1, "")
-    prop_b23 = safe_get_cell(property_details, 22, 1, "")
-    prop_b26 = safe_get_cell(property_details, 25, 1, "")
-    prop_b27 = safe_get_cell(property_details, 26, 1, "")
-    prop_b28 = safe_get_cell(property_details, 27, 1, "")
-    prop_b32 = safe_get_cell(property_details, 31, 1, 0)
-
-    channel_b5 = safe_get_cell(channel_platform, 4, 1, "")
-    channel_c5 = safe_get_cell(channel_platform, 4, 2, "")
-    channel_c6 = safe_get_cell(channel_platform, 5, 2, "")
-    channel_c7 = safe_get_cell(channel_platform, 6, 2, "")
-    channel_c8 = safe_get_cell(channel_platform, 7, 2, "")
-    channel_c9 = safe_get_cell(channel_platform, 8, 2, "")
-    channel_e9 = safe_get_cell(channel_platform, 8, 4, 0)
-    channel_e10 = safe_get_cell(channel_platform, 9, 4, 0)
-    channel_g5 = safe_get_cell(channel_platform, 4, 6, 0)
-    channel_g6 = safe_get_cell(channel_platform, 5, 6, 0)
-    channel_g7 = safe_get_cell(channel_platform, 6, 6, 0)
-    channel_g8 = safe_get_cell(channel_platform, 7, 6, 0)
-    channel_o5 = safe_get_cell(channel_platform, 4, 14, 0)
-    channel_o6 = safe_get_cell(channel_platform, 5, 14, 0)
-    channel_o7 = safe_get_cell(channel_platform, 6, 14, 0)
-    channel_o8 = safe_get_cell(channel_platform, 7, 14, 0)
-    channel_j9 = safe_get_cell(channel_platform, 8, 9, 0)
-    channel_j10 = safe_get_cell(channel_platform, 9, 9, 0)
-    channel_k9 = safe_get_cell(channel_platform, 8, 10, 0)
-    channel_k10 = safe_get_cell(channel_platform, 9, 10, 0)
-    channel_l9 = safe_get_cell(channel_platform, 8, 11, 0)
-    channel_l10 = safe_get_cell(channel_platform, 9, 11, 0)
-
-    program_l11 = safe_get_cell(program_performance, 10, 11, 0)
-    program_l12 = safe_get_cell(program_performance, 11, 11, 0)
-    program_f11 = safe_get_cell(program_performance, 10, 5, 0)
-    program_g11 = safe_get_cell(program_performance, 10, 6, 0)
-    program_f12 = safe_get_cell(program_performance, 11, 5, 0)
-    program_g12 = safe_get_cell(program_performance, 11, 6, 0)
-
-    current_year = datetime.now().year
-
-    safe_set_cell(sheet2, 'B2', f"{prop_b1} - {current_year} Driven By: {prop_b29}")
-    safe_set_cell(sheet2, 'C5', prop_b3)
+    if tvrs is not None:
+        tvr_future = Future()
+        tvr_future.set_result(tvrs)
+    else:
+        # Start the slow TVR lookup now so it overlaps with filling the workbook
+        tvr_future = _tvr_executor.submit(in_context(extract_tvr_data), input_sheets)
 
+    # Values come from the input sheets once, then derived values are added
+    values = read_values(ONE_PAGER_PLAN, input_sheets)
+    values["current_year"] = datetime.now().year
+
+    prop_b8 = values["prop_b8"]
     if isinstance(prop_b8, str):
         prop_b8 = datetime.strptime(prop_b8, "%d %B %Y")
-    campaign_end_date = prop_b8 + timedelta(weeks=prop_b14)
+    campaign_end_date = prop_b8 + timedelta(weeks=values["prop_b14"])
     start_month = prop_b8.strftime("%b'%y")
     end_month = campaign_end_date.strftime("%b'%y")
-    result = f"{start_month} - {end_month}"
+    values["campaign_months"] = f"{start_month} - {end_month}"
 
-    # ER and CPRP Channels
-    er_file_path = os.path.join(os.path.dirname(skeleton_path), "ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx")
-    if not os.path.exists(er_file_path):
-        logger.error(f"ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx file not found at {er_file_path}")
-        raise FileNotFoundError(f"ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx file not found at {er_file_path}")
+    # ER and CPRP Channels (cached per worker, reloaded when the file changes)
+    with timed_stage("reference_lookup"):
+        reference = get_reference(er_file_path)
+        values["er_net_rate"] = lookup(reference, values["channel_c6"], 'Net Rate')
+        values["market_cprp"] = lookup(reference, values["channel_c5"], 'Market CPRP')
+        values["all_india_cprp"] = reference["all_india_cprp"]
 
-    er_dfa = pd.read_excel(er_file_path, sheet_name="ER Channels")
-    er_dfb = pd.read_excel(er_file_path, sheet_name="CPRP Channels")
+    # Parse dates
+    start_dates = datetime.strptime(str(values["program_f12"]).strip(), "%Y-%m-%d %H:%M:%S")
+    end_dates = datetime.strptime(str(values["program_g12"]).strip(), "%Y-%m-%d %H:%M:%S")
+    start_formatted = start_dates.strftime("%b'%y")
+    end_formatted = end_dates.strftime("%b'%y")
+    values["program_months"] = f"{start_formatted} - {end_formatted}"
 
-    if 'Channels' not in er_dfa.columns or 'Net Rate' not in er_dfa.columns:
-        logger.error("ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx must have 'Channels' and 'Net Rate' columns.")
-        raise ValueError("Missing required columns in ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx")
+    if summary:
+        try:
+            wait_for_tvrs(tvr_future, values)
+        finally:
+            tvr_future.cancel()
+        with timed_stage("evaluate"):
+            return one_pager_summary(evaluate_one_pager(skeleton_path, values), values)
 
-    er_channel_name = channel_c6.strip().lower()
-    er_match = er_dfa[er_dfa['Channels'].str.strip().str.lower() == er_channel_name]
-    er_value = er_match.iloc[0]['Net Rate'] if not er_match.empty else "(ER not found)"
-    safe_set_cell(sheet2, 'M31', er_value)
+    try:
+        if OUTPUT_WRITER == "xml":
+            output_data = render_xml(skeleton_path, values, tvr_future)
+        else:
+            output_data = render_openpyxl(skeleton_path, values, tvr_future)
+    finally:
+        tvr_future.cancel()
 
-    if 'Channels' not in er_dfb.columns:
-        logger.error("ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx must have 'Channels' column.")
-        raise ValueError("Missing required columns in ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx")
+    # Outputs rendered without TVRs are not cached, so a DB outage is not replayed to later resends
+    tvrs = [values.get(name) for name in TVR_NAMES]
+    if cache_key is not None and None not in tvrs:
+        output_cache.put(cache_key, output_data, tvrs)
 
-    er_channel_name2 = channel_c5.strip().lower()
-    er_match2 = er_dfb[er_dfb['Channels'].str.strip().str.lower() == er_channel_name2]
-    er_values = er_match2.iloc[0]['Market CPRP'] if not er_match2.empty else "(ER not found)"
-    safe_set_cell(sheet2, 'M28', er_values)
+    payload_bytes.observe(len(output_data), "output")
+    return finish_output(output_data, output_path)
 
-    if 'All India CPRP' not in er_dfb.columns:
-        logger.error("CPRP Channels sheet must have an 'All India CPRP' column.")
-        raise ValueError("Missing 'All India CPRP' column in CPRP Channels sheet")
+def finish_output(output_data, output_path):
+    """Return ``output_data``, or save it to ``output_path`` and return the path."""
+    if output_path is None:
+        logger.info("Process finished. Output kept in memory")
+        return output_data
 
-    all_india_cprp_value = er_dfb['All India CPRP'].dropna().iloc[0]
-    for row in range(28, 32):
-        cell_ref = f'N{row}'
-        safe_set_cell(sheet2, cell_ref, all_india_cprp_value)
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "wb") as f:
+        f.write(output_data)
+    logger.info(f"Process finished. Output saved to {output_path}")
+    return output_path
 
-    # Parse dates
-    start_dates = datetime.strptime(str(program_f12).strip(), "%Y-%m-%d %H:%M:%S")
-    end_dates = datetime.strptime(str(program_g12).strip(), "%Y-%m-%d %H:%M:%S")
-    start_formatted = start_dates.strftime("%b'%y")
-    end_formatted = end_dates.strftime("%b'%y")
-    formatted_range = f"{start_formatted} - {end_formatted}"
-    safe_set_cell(sheet2, 'H21', formatted_range)
-    safe_set_cell(sheet2, 'H22', formatted_range)
-
-     # Row 10
-    safe_set_cell(sheet2, 'D15', channel_c9) # C9
-    safe_set_cell(sheet2, 'C10', result)
-    safe_set_cell(sheet2, 'D10', prop_b11)  # B11
-    safe_set_cell(sheet2, 'E10', prop_b7)   # B7
-    safe_set_cell(sheet2, 'F10', f"{prop_b9} - {prop_b10}")  # B9 - B10
- 
- # Row 21
-    safe_set_cell(sheet2, 'C21', channel_c5)  # C5
-    safe_set_cell(sheet2, 'C22', channel_c6)  # C6
-    safe_set_cell(sheet2, 'D21', prop_b1)  # B1
-    safe_set_cell(sheet2, 'D22', prop_b1)  # B1
-    safe_set_cell(sheet2, 'E21', channel_c9)  # C9
-    safe_set_cell(sheet2, 'E22', channel_c9)  # C9
-    safe_set_cell(sheet2, 'G21', program_l11)  # L11
-    safe_set_cell(sheet2, 'G22', program_l12)  # L12 
-
- # Rows 29-32 (Channel & Platform section)
-    safe_set_cell(sheet2, 'C28', channel_c5)  # C5
-    safe_set_cell(sheet2, 'C29', channel_c6)  # C6
-    safe_set_cell(sheet2, 'C30', channel_c5)  # C7
-    safe_set_cell(sheet2, 'C31', channel_c6)  # C8
- 
-    safe_set_cell(sheet2, 'D28', prop_b1)  # B1
-    safe_set_cell(sheet2, 'D29', prop_b1)  # B1
-    safe_set_cell(sheet2, 'D30', prop_b1)  # B1
-    safe_set_cell(sheet2, 'D31', prop_b1)  # B1
- 
-    safe_set_cell(sheet2, 'E28', prop_b12 - 2)  # B12 - 2
-    safe_set_cell(sheet2, 'E29', prop_b12 - 2)  # B12 - 2
-    safe_set_cell(sheet2, 'E30', prop_b13)  # B13
-    safe_set_cell(sheet2, 'E31', prop_b13)  # B13
- 
-    safe_set_cell(sheet2, 'F28', channel_o5)  # O5
-    safe_set_cell(sheet2, 'F29', channel_o6)  # O6
-    safe_set_cell(sheet2, 'F30', channel_o7)  # O7
-    safe_set_cell(sheet2, 'F31', channel_o8)  # O8
- 
- # Set formulas for calculated cells
-    safe_set_cell(sheet2, 'G28', "=F28*E28")
-    safe_set_cell(sheet2, 'G29', "=F29*E29")
-    safe_set_cell(sheet2, 'G30', "=F30*E30")
-    safe_set_cell(sheet2, 'G31', "=F31*E31")
-    safe_set_cell(sheet2, 'G32', "=SUM(G28:G31)")
-
-    safe_set_cell(sheet2, 'J28', "=I28*G28/10")
-    safe_set_cell(sheet2, 'J29', "=I29*G29/10")
-    safe_set_cell(sheet2, 'J30', "=I30*G30/10")
-    safe_set_cell(sheet2, 'J31', "=I31*G31/10")
-    safe_set_cell(sheet2, 'J32', "=SUM(J28:J31)")
-
- # For cells K29 to K32 (grouped)
-    formula_k = "=L32/G32*10"
-    safe_set_cell(sheet2, 'K28', formula_k)
-    safe_set_cell(sheet2, 'K29', formula_k)
-    safe_set_cell(sheet2, 'K30', formula_k)
-    safe_set_cell(sheet2, 'K31', formula_k)
- 
- # For cells L29 to L32 (grouped)
-    formula_l = f"={prop_b32}*10000000"
-    safe_set_cell(sheet2, 'L28', formula_l)
-    safe_set_cell(sheet2, 'L29', formula_l)
-    safe_set_cell(sheet2, 'L30', formula_l)
-    safe_set_cell(sheet2, 'L31', formula_l)
-    safe_set_cell(sheet2, 'L32', "=SUM(L28:L31)")
- 
- # For cells O29 to O32 (data unavailable)
-    safe_set_cell(sheet2, 'O28', "=J28*N28")
-    safe_set_cell(sheet2, 'O29', "=J29*N29")
-    safe_set_cell(sheet2, 'O30', "=J30*N30")
-    safe_set_cell(sheet2, 'O31', "=J31*N31")
-    safe_set_cell(sheet2, 'O32', "=SUM(O28:O31)")
- 
- # Rows 38-39 (Second section)
-    safe_set_cell(sheet2, 'C37', channel_c9)  # C9
-    safe_set_cell(sheet2, 'C38', channel_c9)  # C9
- 
-    safe_set_cell(sheet2, 'D37', prop_b1)  # B1
-    safe_set_cell(sheet2, 'D38', prop_b1)  # B1
- 
-    safe_set_cell(sheet2, 'E37', channel_c9)  # C9
-    safe_set_cell(sheet2, 'E38', channel_c9)  # C9
- 
-    safe_set_cell(sheet2, 'F37', channel_e9)  # E9
-    safe_set_cell(sheet2, 'F38', channel_e10)  # E10
- 
-    safe_set_cell(sheet2, 'G37', "=(I38*1000000)*0.6")  # 60% as decimal
-    safe_set_cell(sheet2, 'G38', "=(I39*1000000)*0.6")
-    safe_set_cell(sheet2, 'G39', "=SUM(G37:G38)")
- 
-    safe_set_cell(sheet2, 'H37', "=(I38*1000000)*0.4")  # 40% as decimal
-    safe_set_cell(sheet2, 'H38', "=(I39*1000000)*0.4")
- 
-    safe_set_cell(sheet2, 'I37', channel_k9)  # K9
-    safe_set_cell(sheet2, 'I38', channel_k10)  # K10
- 
-    safe_set_cell(sheet2, 'J37', channel_j9)  # J9
-    safe_set_cell(sheet2, 'J38', channel_j10)  # J10
- 
-    safe_set_cell(sheet2, 'K37', channel_l9)  # L9
-    safe_set_cell(sheet2, 'K38', channel_l10)  # L10
- 
-    safe_set_cell(sheet2, 'L37', "=(K37*I37/1000)*10^6")
-    safe_set_cell(sheet2, 'L38', "=(K38*I38/1000)*10^6")
-    safe_set_cell(sheet2, 'L39', "=SUM(L37:L38)")
- 
- # For cells O38 to O39 (data unavailable)
-    safe_set_cell(sheet2, 'O38', "(data unavailable)")
-    safe_set_cell(sheet2, 'O39', "(data unavailable)")
- 
- # Row 46
-    #safe_set_cell(sheet2, 'D46', "=L33/10^7")
- 
-    #safe_set_cell(sheet2, 'E46', "=(L33+L40)/10^7")
- 
- # Now fill data in Sheet 1 (Summary)
-    logger.info("Filling Sheet 1: Summary")
- 
- # B2 to K2 (grouped) = property details B1 - {current year} Driven By {property details B29}
-    safe_set_cell(sheet1, 'B2', f"{prop_b1} - {current_year} Driven By {prop_b29}")
- 
- # Various cells from Property Details
-    safe_set_cell(sheet1, 'D4', result)  # property details B8
-    safe_set_cell(sheet1, 'D5', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'D6', prop_a29)  # property details A29
-    safe_set_cell(sheet1, 'D7', prop_b4)  # property details B4
-    safe_set_cell(sheet1, 'D10', prop_b20)  # property details B20
-    safe_set_cell(sheet1, 'D11', prop_b23)  # property details B23
-    safe_set_cell(sheet1, 'H10', prop_b21)  # property details B21
-    safe_set_cell(sheet1, 'H11', prop_b22)  # property details B22
-    safe_set_cell(sheet1, 'D14', prop_b26)  # property details B26
-    safe_set_cell(sheet1, 'D15', prop_b29)  # property details B29
-    safe_set_cell(sheet1, 'H14', prop_b27)  # property details B27
-    safe_set_cell(sheet1, 'H15', prop_b28)  # property details B28
-    safe_set_cell(sheet1, 'D19', f"{prop_b9} - {prop_b10} (Timing)")  # property details B9 - B10(timing)
- 
- # Static text entries
-    safe_set_cell(sheet1, 'D20', "TV Telecast - On")
-    safe_set_cell(sheet1, 'D21', "Digital Telecast - On")
- 
- # Channel & Platform details
-    safe_set_cell(sheet1, 'C26', channel_c5)  # channel & platform details C5
-    safe_set_cell(sheet1, 'C27', channel_c6)  # channel & platform details C6
-    safe_set_cell(sheet1, 'C28', channel_c5)  # channel & platform details C7
-    safe_set_cell(sheet1, 'C29', channel_c6)  # channel & platform details C8
- 
- # Property details for rows 26-29
-    safe_set_cell(sheet1, 'D26', prop_b12 - 2)  # property details {value in (B12) -2}
-    safe_set_cell(sheet1, 'D27', prop_b12 - 2)  # property details {value in (B12) -2}
-    safe_set_cell(sheet1, 'D28', prop_b13)  # property details B13
-    safe_set_cell(sheet1, 'D29', prop_b13)  # property details B13
- 
-    safe_set_cell(sheet1, 'E26', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'E27', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'E28', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'E29', prop_b1)  # property details B1
- 
- # E46 = =(L33+L40)/10^7
- 
-    safe_set_cell(sheet1, 'F26', channel_g5)  # channel_g5
-    safe_set_cell(sheet1, 'F27', channel_g6)  # channel_g6
-    safe_set_cell(sheet1, 'F28', channel_g7)  # channel_g7
-    safe_set_cell(sheet1, 'F29', channel_g8)  # channel_g8
-
- # Channel & Platform details for rows 34-35
-    safe_set_cell(sheet1, 'C34', channel_c9)  # channel & platform details C9
-    safe_set_cell(sheet1, 'C35', channel_c9)  # channel & platform details C9
-    safe_set_cell(sheet1, 'D34', channel_e9)  # channel & platform details E9
-    safe_set_cell(sheet1, 'D35', channel_e10)  # channel & platform details E10
-    safe_set_cell(sheet1, 'E34', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'E35', prop_b1)  # property details B1
-    safe_set_cell(sheet1, 'F34', channel_j9)  # channel & platform details J9
-    safe_set_cell(sheet1, 'F35', channel_j10)  # channel & platform details J10
-    safe_set_cell(sheet1, 'G34', channel_k9)  # channel & platform details K9
-    safe_set_cell(sheet1, 'G26', channel_b5)  # channel & platform details B5
-    safe_set_cell(sheet1, 'G27', channel_b5)  # channel & platform details B5
-    safe_set_cell(sheet1, 'G28', channel_b5)  # channel & platform details B5
-    safe_set_cell(sheet1, 'G29', channel_b5)  # channel & platform details B5
-    safe_set_cell(sheet1, 'G35', channel_k10)  # channel & platform details K10
- 
- # D41 to E41 (grouped) = Sheet1 D46
- # We'll copy the formula from Sheet2 D46
- #sheet2_d46_formula = "=L33/10^7"  # Same formula as in Sheet2
- #safe_set_cell(sheet1, 'D41', sheet2_d46_formula)
- 
-    safe_set_cell(sheet1, 'D41', "='DBD One Pager-with Eval.'!D45")
- 
-    safe_set_cell(sheet1, 'F41', "='DBD One Pager-with Eval.'!D47")
-
-    # TVR extraction
-    tvrs = extract_tvr_data(input_a_path)
+def wait_for_tvrs(tvr_future, values):
+    """Add the background TVRs to ``values``; False when none came back."""
+    with timed_stage("tvr_wait"):
+        tvrs = tvr_future.result()
     if tvrs and len(tvrs) >= 4:
-        safe_set_cell(sheet2, 'I28', tvrs[0])
-        safe_set_cell(sheet2, 'I29', tvrs[1])
-        safe_set_cell(sheet2, 'I30', tvrs[0])
-        safe_set_cell(sheet2, 'I31', tvrs[1])
-        safe_set_cell(sheet2, 'H28', tvrs[2])
-        safe_set_cell(sheet2, 'H29', tvrs[3])
-        safe_set_cell(sheet2, 'H30', tvrs[2])
-        safe_set_cell(sheet2, 'H31', tvrs[3])
+        values.update(zip(TVR_NAMES, tvrs))
         logger.info(f"TVRs written: I28={tvrs[0]}, I29={tvrs[1]}, I30={tvrs[0]}, I31={tvrs[1]}, H28={tvrs[2]}, H29={tvrs[3]}, H30={tvrs[2]}, H31={tvrs[3]}")
-    else:
-        logger.warning("No TVRs returned to write in H30, I30.")
+        return True
+    logger.warning("No TVRs returned to write in H30, I30.")
+    return False
 
-    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-    wb.save(output_path)
-    logger.info(f"Process finished. Output saved to {output_path}")
-    print(f"Detailed Package file generated successfully")
\ No newline at end of file
+def render_openpyxl(skeleton_path, values, tvr_future):
+    """Completed workbook bytes from the pooled openpyxl skeleton."""
+    # Skeleton is loaded once per worker and reset after each request
+    with timed_stage("template_acquire"):
+        template = acquire_template(skeleton_path)
+    wb = template.workbook
+    worksheets = [wb[wb.sheetnames[SUMMARY]], wb[wb.sheetnames[ONE_PAGER]]]
+    anchors = [template.anchors[ws.title] for ws in worksheets]
+
+    try:
+        logger.info("Filling Sheet 1: Summary and Sheet 2: One Pager")
+        with timed_stage("fill"):
+            apply_plan(ONE_PAGER_PLAN, worksheets, anchors, values)
+
+        # TVR extraction (started in the background right after input parsing)
+        if wait_for_tvrs(tvr_future, values):
+            apply_plan(TVR_PLAN, worksheets, anchors, values)
+
+        with timed_stage("save"):
+            buffer = BytesIO()
+            wb.save(buffer)
+            return buffer.getvalue()
+    finally:
+        release_template(template)
+
+def render_xml(skeleton_path, values, tvr_future):
+    """Completed workbook bytes by patching only the target cells of the skeleton's sheet XML.
+
+    Falls back to ``render_openpyxl`` for values the XML writer cannot encode.
+    """
+    writes = collect_writes(ONE_PAGER_PLAN, values)
+    if wait_for_tvrs(tvr_future, values):
+        writes += collect_writes(TVR_PLAN, values)
+    cached = None
+    if EVALUATE_FORMULAS:
+        with timed_stage("evaluate"):
+            cached = Evaluator(load_model(skeleton_path), writes).formula_values([SUMMARY, ONE_PAGER])
+    try:
+        with timed_stage("xml_render"):
+            return get_xml_template(skeleton_path).render(writes, cached)
+    except UnsupportedValue as e:
+        logger.warning(f"{e}; using the openpyxl writer (output has no cached formula values)")
+        return render_openpyxl(skeleton_path, values, tvr_future)
+
+def evaluate_one_pager(skeleton_path, values):
+    """Formula evaluator over the skeleton with this request's writes applied."""
+    writes = collect_writes(ONE_PAGER_PLAN, values)
+    if all(name in values for name in TVR_NAMES):
+        writes += collect_writes(TVR_PLAN, values)
+    return Evaluator(load_model(skeleton_path), writes)
+
+def _json_value(value):
+    if hasattr(value, "item") and not isinstance(value, str):
+        return value.item()
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+def one_pager_summary(evaluator, values):
+    """Computed GRPs, costs and CPRPs of the one-pager as plain JSON-serialisable data."""
+    def table(columns, rows, total_row):
+        lines = [{field: _json_value(evaluator.value(ONE_PAGER, f"{col}{row}")) for field, col in columns.items()}
+                 for row in rows]
+        total = {field: _json_value(evaluator.value(ONE_PAGER, f"{col}{total_row}"))
+                 for field, col in columns.items() if field not in LABEL_FIELDS}
+        return {"lines": lines, "total": total}
+
+    return {
+        "title": _json_value(evaluator.value(ONE_PAGER, "B2")),
+        "campaign": _json_value(values["campaign_months"]),
+        "tvrs": {name: _json_value(values.get(name)) for name in TVR_NAMES},
+        "tv": table(TV_COLUMNS, TV_ROWS, TV_TOTAL_ROW),
+        "digital": table(DIGITAL_COLUMNS, DIGITAL_ROWS, DIGITAL_TOTAL_ROW),
+        "totals": {field: _json_value(evaluator.value(ONE_PAGER, cell)) for field, cell in TOTAL_CELLS.items()},
+    }
@@ -0,0 +1,138 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Prometheus text exposition (format 0.0.4) for this worker process; no client library needed
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+_metrics = []
+_collectors = []
+_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        # Unlabelled counters are exported as 0 before their first increment
+        self._values = {} if self.label_names else {(): 0}
+        with _lock:
+            _metrics.append(self)
+
+    def inc(self, *labels, amount=1):
+        with _lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with _lock:
+            return [(self.name, _labels(self.label_names, labels), value) for labels, value in sorted(self._values.items())]
+
+class Histogram:
+    """Cumulative-bucket histogram with ``_bucket``, ``_sum`` and ``_count`` series."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        with _lock:
+            _metrics.append(self)
+
+    def observe(self, value, *labels):
+        with _lock:
+            counts, total = self._values.get(labels, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[labels] = (counts, total + value)
+
+    def totals(self):
+        """{label values: (count, sum)} observed so far."""
+        with _lock:
+            return {labels: (counts[-1], total) for labels, (counts, total) in self._values.items()}
+
+    def samples(self):
+        with _lock:
+            items = sorted(self._values.items())
+        samples = []
+        for labels, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                samples.append((f"{self.name}_bucket", _labels(self.label_names, labels, [("le", _number(bound))]), count))
+            samples.append((f"{self.name}_sum", _labels(self.label_names, labels), total))
+            samples.append((f"{self.name}_count", _labels(self.label_names, labels), counts[-1]))
+        return samples
+
+def register_stats(name, help, stats, label=None, kind="counter"):
+    """Export an existing ``stats`` dict (or a callable returning one) as one metric family.
+
+    Keys become values of ``label``; with a tuple of label names the keys are
+    tuples, and with ``label=None`` ``stats`` is a single number.
+    """
+    with _lock:
+        _collectors.append((name, help, stats, label, kind))
+
+def _stat_lines(name, values, label):
+    if label is None:
+        return [f"{name} {_number(values)}"]
+    names = (label,) if isinstance(label, str) else tuple(label)
+    lines = []
+    for key, value in sorted(dict(values).items()):
+        key = (key,) if isinstance(label, str) else key
+        lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+    return lines
+
+def render():
+    """Every metric of this process in Prometheus text format."""
+    lines = []
+    for metric in list(_metrics):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {_number(value)}" for name, labels, value in metric.samples())
+    for name, help, stats, label, kind in list(_collectors):
+        values = stats() if callable(stats) else stats
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(_stat_lines(name, values, label))
+    return "\n".join(lines) + "\n"
+
+# === PIPELINE METRICS ===
+stage_seconds = Histogram("onepager_stage_seconds", "Time spent in each pipeline stage.", ["stage"])
+requests_total = Counter("onepager_requests_total", "HTTP requests by endpoint and status code.", ["endpoint", "status"])
+request_seconds = Histogram("onepager_request_seconds", "End-to-end HTTP request latency.", ["endpoint"])
+errors_total = Counter("onepager_errors_total", "Failures by pipeline stage.", ["stage"])
+db_retries_total = Counter("onepager_db_retries_total", "Failed SQL Server attempts that were retried.")
+db_failures_total = Counter("onepager_db_failures_total", "SQL Server operations that failed after every retry.")
+payload_bytes = Histogram("onepager_payload_bytes", "Sizes of uploaded inputs and rendered outputs.", ["kind"], SIZE_BUCKETS)
+
+@contextmanager
+def timed_stage(stage):
+    """Record the duration of the block under ``stage``; failures are also counted."""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors_total.inc(stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - started, stage)
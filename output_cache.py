@@ -0,0 +1,95 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Rendered workbooks kept per worker ("0" disables the cache) and how long an entry is reused
+OUTPUT_CACHE_MAX_BYTES = int(os.environ.get("OUTPUT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+OUTPUT_CACHE_TTL_SECONDS = int(os.environ.get("OUTPUT_CACHE_TTL_SECONDS", "3600"))
+
+def input_key(input_a, input_b, *versions):
+    """Content address of one submission: both uploads plus everything else the output depends on.
+
+    ``versions`` are JSON-serialisable extras such as the skeleton and reference
+    file versions, the output writer and the year stamped into the title.
+    """
+    digest = hashlib.sha256()
+    for data in (input_a, input_b):
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    digest.update(json.dumps(versions, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+def output_digest(key, tvrs):
+    """Identity of a rendered output: the submission key plus the TVR values written into it."""
+    return hashlib.sha256(json.dumps([key, [float(tvr) for tvr in tvrs]]).encode("utf-8")).hexdigest()
+
+class OutputCache:
+    """LRU of rendered workbooks keyed by ``input_key``, bounded by total bytes.
+
+    Each entry remembers the TVRs it was rendered with. Entries expire after
+    ``ttl`` seconds, so a resend picks up refreshed TVRs within that window.
+    """
+
+    def __init__(self, max_bytes=OUTPUT_CACHE_MAX_BYTES, ttl=OUTPUT_CACHE_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def get(self, key):
+        """Return the cached entry {"data", "tvrs", "digest", "stored_at"} for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["stored_at"] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+            if entry is not None:
+                self._drop(key)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, data, tvrs):
+        """Store a rendered workbook; outputs larger than the whole cache are skipped."""
+        if not self.enabled or len(data) > self.max_bytes:
+            return None
+        entry = {"data": data, "tvrs": list(tvrs), "digest": output_digest(key, tvrs), "stored_at": time.time()}
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = entry
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.stats["evictions"] += 1
+            self.stats["stores"] += 1
+        return entry
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        self.size -= len(entry["data"])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+output_cache = OutputCache()
+register_stats("onepager_output_cache_events_total", "Output cache lookups, stores and evictions.", output_cache.stats, "event")
+register_stats("onepager_output_cache_bytes", "Bytes of rendered workbooks held in the output cache.", lambda: output_cache.size, kind="gauge")
@@ -0,0 +1,163 @@
+import cProfile
+import glob
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# Shared secret for on-demand profiling and downloads (X-Profile-Token); unset disables both
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+# Fraction of render requests profiled without being asked (0 = only on demand)
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+# Also trace allocations with tracemalloc ("0" = CPU profile only) and how many frames to keep per allocation
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY", "1") != "0"
+PROFILE_TRACE_FRAMES = int(os.environ.get("PROFILE_TRACE_FRAMES", "1"))
+# Where captures are kept, how many and for how long
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "20"))
+PROFILE_RETENTION_HOURS = int(os.environ.get("PROFILE_RETENTION_HOURS", "24"))
+# Functions and allocation sites listed in each capture's summary
+PROFILE_TOP_N = int(os.environ.get("PROFILE_TOP_N", "30"))
+
+_PROFILE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+class RequestProfiler:
+    """Opt-in cProfile + tracemalloc capture of single requests.
+
+    A capture is taken when an authorized caller asks for one or when the
+    request is sampled. Only one request per process is profiled at a time
+    (tracemalloc is process-wide); others run unprofiled rather than wait.
+    cProfile only sees the request thread, so work in the TVR thread shows up
+    as time spent waiting on its future. Each capture is written as
+    ``<id>.prof`` (pstats format, for snakeviz/pstats) and ``<id>.json`` (summary).
+    """
+
+    def __init__(self, directory=PROFILE_DIR, token=PROFILE_TOKEN, sample_rate=PROFILE_SAMPLE_RATE,
+                 memory=PROFILE_MEMORY, max_files=PROFILE_MAX_FILES, retention_hours=PROFILE_RETENTION_HOURS):
+        self.directory = directory
+        self.token = token
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.max_files = max_files
+        self.retention_hours = retention_hours
+        self.stats = {"requested": 0, "sampled": 0, "skipped_busy": 0, "errors": 0}
+        self._active = threading.Lock()
+
+    def authorized(self, token):
+        return bool(self.token) and bool(token) and hmac.compare_digest(token, self.token)
+
+    @contextmanager
+    def capture(self, label, requested=False):
+        """Profile the block if ``requested`` or sampled; yields the capture record or None."""
+        sampled = not requested and self.sample_rate > 0 and random.random() < self.sample_rate
+        if not (requested or sampled) or not self._active.acquire(blocking=False):
+            if requested or sampled:
+                self.stats["skipped_busy"] += 1
+            yield None
+            return
+        self.stats["requested" if requested else "sampled"] += 1
+        record = {"id": uuid.uuid4().hex, "label": label, "trigger": "requested" if requested else "sampled",
+                  "timestamp": datetime.now().isoformat(timespec="seconds")}
+        tracing = self.memory and not tracemalloc.is_tracing()
+        try:
+            if tracing:
+                tracemalloc.start(PROFILE_TRACE_FRAMES)
+            profiler = cProfile.Profile()
+            started = time.perf_counter()
+            profiler.enable()
+            try:
+                yield record
+            finally:
+                profiler.disable()
+                record["wall_seconds"] = round(time.perf_counter() - started, 4)
+                if tracing:
+                    self._record_memory(record)
+                try:
+                    self._save(record, profiler)
+                except Exception:
+                    self.stats["errors"] += 1
+                    logger.exception("Failed to save request profile")
+        finally:
+            if tracing:
+                tracemalloc.stop()
+            self._active.release()
+
+    def _record_memory(self, record):
+        current, peak = tracemalloc.get_traced_memory()
+        record["memory_peak_bytes"] = peak
+        record["memory_retained_bytes"] = current
+        top = tracemalloc.take_snapshot().statistics("lineno")[:PROFILE_TOP_N]
+        record["top_allocations"] = [{"site": str(stat.traceback[0]), "bytes": stat.size, "count": stat.count}
+                                     for stat in top]
+
+    def _save(self, record, profiler):
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(os.path.join(self.directory, f"{record['id']}.prof"))
+
+        stats = pstats.Stats(profiler, stream=io.StringIO())
+        record["total_calls"] = stats.total_calls
+        top = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:PROFILE_TOP_N]
+        record["top_functions"] = [
+            {"function": f"{path}:{line}({name})", "calls": calls, "own_seconds": round(own, 4), "cumulative_seconds": round(cumulative, 4)}
+            for (path, line, name), (_, calls, own, cumulative, _) in top
+        ]
+        with open(os.path.join(self.directory, f"{record['id']}.json"), "w", encoding="utf-8") as f:
+            json.dump(record, f, indent=2)
+        logger.info(f"Profile {record['id']} saved for {record['label']} ({record['wall_seconds']}s, "
+                    f"peak {record.get('memory_peak_bytes', 'n/a')} bytes)")
+        self._apply_retention()
+
+    def _apply_retention(self):
+        summaries = sorted(glob.glob(os.path.join(self.directory, "*.json")), key=os.path.getmtime)
+        cutoff = time.time() - self.retention_hours * 3600
+        for index, path in enumerate(summaries):
+            if os.path.getmtime(path) < cutoff or index < len(summaries) - self.max_files:
+                for stale in (path, path[:-len(".json")] + ".prof"):
+                    try:
+                        os.remove(stale)
+                    except OSError:
+                        pass
+
+    def path(self, profile_id, extension):
+        """File of a stored capture, or None for unknown or malformed ids."""
+        if not _PROFILE_ID.match(profile_id or ""):
+            return None
+        path = os.path.join(self.directory, f"{profile_id}.{extension}")
+        return path if os.path.exists(path) else None
+
+    def summary(self, profile_id):
+        path = self.path(profile_id, "json")
+        if path is None:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self):
+        """Stored captures, newest first, without the per-function detail."""
+        captures = []
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json")), key=os.path.getmtime, reverse=True):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            captures.append({key: record.get(key) for key in
+                             ("id", "label", "trigger", "timestamp", "wall_seconds", "memory_peak_bytes")})
+        return captures
+
+request_profiler = RequestProfiler()
+register_stats("onepager_profiles_total", "Request profiles captured or skipped.", request_profiler.stats, "event")
@@ -0,0 +1,65 @@
+import pandas as pd
+import logging
+import os
+
+from file_cache import VersionedCache
+
+logger = logging.getLogger(__name__)
+
+ER_CPRP_FILENAME = "ER and CPRP Channels TV and Digital CTV-Mobile CPM.xlsx"
+
+def normalize_channel(name):
+    """Normalise a channel name the same way for the index and for lookups."""
+    return str(name).strip().lower()
+
+def _build_reference(path):
+    er_dfa = pd.read_excel(path, sheet_name="ER Channels")
+    er_dfb = pd.read_excel(path, sheet_name="CPRP Channels")
+
+    if 'Channels' not in er_dfa.columns or 'Net Rate' not in er_dfa.columns:
+        logger.error(f"{ER_CPRP_FILENAME} must have 'Channels' and 'Net Rate' columns.")
+        raise ValueError(f"Missing required columns in {ER_CPRP_FILENAME}")
+
+    if 'Channels' not in er_dfb.columns:
+        logger.error(f"{ER_CPRP_FILENAME} must have 'Channels' column.")
+        raise ValueError(f"Missing required columns in {ER_CPRP_FILENAME}")
+
+    if 'All India CPRP' not in er_dfb.columns:
+        logger.error("CPRP Channels sheet must have an 'All India CPRP' column.")
+        raise ValueError("Missing 'All India CPRP' column in CPRP Channels sheet")
+
+    all_india = er_dfb['All India CPRP'].dropna()
+    if all_india.empty:
+        raise ValueError("'All India CPRP' column in CPRP Channels sheet has no values")
+
+    # First row wins for duplicate channel names, matching the old .iloc[0] lookup
+    index = {}
+    for name, net_rate in zip(er_dfa['Channels'], er_dfa['Net Rate']):
+        if isinstance(name, str):
+            index.setdefault(normalize_channel(name), {}).setdefault('Net Rate', net_rate)
+    if 'Market CPRP' in er_dfb.columns:
+        for name, cprp in zip(er_dfb['Channels'], er_dfb['Market CPRP']):
+            if isinstance(name, str):
+                index.setdefault(normalize_channel(name), {}).setdefault('Market CPRP', cprp)
+
+    return {"index": index, "all_india_cprp": all_india.iloc[0]}
+
+_references = VersionedCache(lambda path, version: _build_reference(path), "reference data")
+
+def get_reference(path):
+    """Return the indexed ER/CPRP reference data, reloading only when the file changes.
+
+    The workbook is parsed once per worker process; later calls only ``stat`` the
+    file and compare its mtime and size against the cached version.
+    """
+    if not os.path.exists(path):
+        logger.error(f"{ER_CPRP_FILENAME} file not found at {path}")
+        raise FileNotFoundError(f"{ER_CPRP_FILENAME} file not found at {path}")
+    return _references.get(path)
+
+def lookup(reference, channel, column, default="(ER not found)"):
+    """O(1) lookup of ``column`` ('Net Rate' or 'Market CPRP') for ``channel``."""
+    return reference["index"].get(normalize_channel(channel), {}).get(column, default)
+
+def clear_cache():
+    _references.clear()
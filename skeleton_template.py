@@ -0,0 +1,101 @@
+from copy import copy
+
+from openpyxl import load_workbook
+from openpyxl.utils import get_column_letter
+import logging
+import os
+import threading
+
+from file_cache import file_version
+
+logger = logging.getLogger(__name__)
+
+# Idle workbooks kept per skeleton path; more are loaded on demand under load
+MAX_IDLE_TEMPLATES = int(os.environ.get("SKELETON_POOL_SIZE", "4"))
+
+_pools = {}
+_lock = threading.Lock()
+
+class SkeletonTemplate:
+    """A loaded skeleton workbook plus the indexes needed to fill and reuse it.
+
+    ``anchors`` maps sheet title -> {cell coordinate: merged-range start cell}
+    for every cell covered by a merged range, so writes resolve in O(1).
+    ``snapshot`` keeps each sheet's original cells (value, type, style,
+    hyperlink and comment) so ``reset`` can return the workbook to its pristine
+    state after a request instead of re-parsing it. Styles must be restored
+    too: writing a datetime sets a date number format on the cell, which would
+    otherwise leak into the next request's numbers.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        self.workbook = load_workbook(path)
+        self.anchors = {}
+        self.snapshot = {}
+        for ws in self.workbook.worksheets:
+            anchors = {}
+            for merged_range in ws.merged_cells.ranges:
+                start = merged_range.start_cell.coordinate
+                for row, col in merged_range.cells:
+                    anchors[f"{get_column_letter(col)}{row}"] = start
+            self.anchors[ws.title] = anchors
+            self.snapshot[ws.title] = {key: _cell_state(cell) for key, cell in ws._cells.items()}
+
+    def reset(self):
+        """Undo every cell write made since the template was loaded."""
+        for ws in self.workbook.worksheets:
+            original = self.snapshot[ws.title]
+            cells = ws._cells
+            for key in [key for key in cells if key not in original]:
+                del cells[key]
+            for key, (value, data_type, style, hyperlink, comment) in original.items():
+                cell = cells[key]
+                if cell._value is not value or cell.data_type != data_type:
+                    cell._value = value
+                    cell.data_type = data_type
+                # Style setters mutate the cell's StyleArray in place, so restore a fresh copy
+                if cell._style != style:
+                    cell._style = copy(style)
+                # MergedCell has no hyperlink/comment slots; those stay None in the snapshot
+                if getattr(cell, "_hyperlink", None) is not hyperlink:
+                    cell._hyperlink = hyperlink
+                if getattr(cell, "_comment", None) is not comment:
+                    cell._comment = comment
+
+def _cell_state(cell):
+    return (cell._value, cell.data_type, copy(cell._style),
+            getattr(cell, "_hyperlink", None), getattr(cell, "_comment", None))
+
+def acquire_template(path):
+    """Check out a ready-to-fill skeleton workbook for ``path``.
+
+    Reuses an idle template when one matches the file's current mtime/size,
+    otherwise loads a fresh one. Pair every call with ``release_template``.
+    """
+    version = file_version(path)
+    with _lock:
+        pool = _pools.setdefault(path, [])
+        while pool:
+            template = pool.pop()
+            if template.version == version:
+                return template
+    logger.info(f"Loading skeleton template from {path}")
+    return SkeletonTemplate(path, version)
+
+def release_template(template):
+    """Reset a template and return it to its pool for the next request."""
+    try:
+        template.reset()
+    except Exception:
+        logger.exception("Could not reset skeleton template; discarding it")
+        return
+    with _lock:
+        pool = _pools.setdefault(template.path, [])
+        if len(pool) < MAX_IDLE_TEMPLATES:
+            pool.append(template)
+
+def clear_pool():
+    with _lock:
+        _pools.clear()
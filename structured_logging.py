@@ -0,0 +1,145 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import register_stats
+
+# "json" (one object per line, picked up as structured logs by Cloud Logging) or "text"
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+# Fraction of requests whose DEBUG records are kept; decided once per request so its lines stay together
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+# Records waiting for the writer thread; beyond this they are dropped instead of blocking requests
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+# Longest string kept when a payload is logged, and the keys whose values are never logged
+LOG_MAX_FIELD_CHARS = int(os.environ.get("LOG_MAX_FIELD_CHARS", "200"))
+REDACTED_KEYS = {"contentBytes", "password", "token"}
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+request_id_var = contextvars.ContextVar("request_id", default="-")
+_debug_sampled = contextvars.ContextVar("debug_sampled", default=True)
+
+stats = {"dropped": 0}
+_listener = None
+
+def begin_request(request_id=None):
+    """Tag records logged in this context with ``request_id`` (a new one if not given)."""
+    request_id = request_id or uuid.uuid4().hex
+    request_id_var.set(request_id)
+    _debug_sampled.set(LOG_DEBUG_SAMPLE_RATE >= 1 or random.random() < LOG_DEBUG_SAMPLE_RATE)
+    return request_id
+
+def debug_enabled(logger):
+    """True when a DEBUG record from ``logger`` would be written for the current request."""
+    return logger.isEnabledFor(logging.DEBUG) and _debug_sampled.get()
+
+def in_context(func):
+    """Wrap ``func`` to run in a copy of the caller's context, so worker threads keep the request id."""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(func, *args, **kwargs)
+
+def redact(value, max_chars=LOG_MAX_FIELD_CHARS):
+    """Copy of a request payload that is safe and cheap to log.
+
+    Values under ``REDACTED_KEYS`` become a length marker and other long
+    strings are truncated, so attachments are never formatted into log lines.
+    """
+    if isinstance(value, dict):
+        return {key: f"<{len(item) if hasattr(item, '__len__') else '?'} chars redacted>" if key in REDACTED_KEYS
+                else redact(item, max_chars) for key, item in value.items()}
+    if isinstance(value, list):
+        return [redact(item, max_chars) for item in value]
+    if isinstance(value, (str, bytes)) and len(value) > max_chars:
+        return f"{value[:max_chars]!r}... <{len(value)} chars>"
+    return value
+
+class ContextFilter(logging.Filter):
+    """Adds ``request_id`` to every record and drops DEBUG records of unsampled requests."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return record.levelno > logging.DEBUG or _debug_sampled.get()
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "thread": record.threadName,
+        }
+        if getattr(record, "fields", None):
+            entry.update(record.fields)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: the caller only interpolates the message.
+
+    Formatting and the write to stdout happen on the listener thread; when the
+    queue is full the record is dropped and counted.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            stats["dropped"] += 1
+
+def _start_listener(handler_queue, output):
+    global _listener
+    _listener = QueueListener(handler_queue, output, respect_handler_level=False)
+    _listener.start()
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def configure_logging(level=logging.INFO, fmt=LOG_FORMAT):
+    """Route all logging through a bounded queue to a single stdout writer thread.
+
+    Safe to call more than once. The writer thread is restarted in forked
+    children (gunicorn preloads the app in the master) and drained at exit.
+    """
+    root = logging.getLogger()
+    if any(isinstance(handler, DroppingQueueHandler) for handler in root.handlers):
+        return
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    handler_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(handler_queue)
+    handler.addFilter(ContextFilter())
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    _start_listener(handler_queue, output)
+    os.register_at_fork(after_in_child=lambda: _start_listener(handler_queue, output))
+    atexit.register(_stop_listener)
+
+register_stats("onepager_log_records_dropped_total", "Log records dropped because the log queue was full.", lambda: stats["dropped"])
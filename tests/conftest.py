@@ -0,0 +1,57 @@
+import os
+import sys
+from io import BytesIO
+
+import pandas as pd
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+# Hermetic runs: no SQL Server, no cross-test caches, nothing written next to the repo
+os.environ.setdefault("TVR_CACHE_PATH", "")
+os.environ.setdefault("OUTPUT_CACHE_MAX_BYTES", "0")
+os.environ.setdefault("DIAGNOSTICS_ENABLED", "0")
+
+from openpyxl import load_workbook  # noqa: E402
+
+from tvr_sources import TVRSource, split_channels  # noqa: E402
+
+SKELETON_FILE = os.path.join(BASE_DIR, "input", "Skeleton Output.xlsx")
+SAMPLE_INPUT_A = os.path.join(BASE_DIR, "input", "non_cricket_input", "Non Cricket Input.xlsx")
+SAMPLE_INPUT_B = os.path.join(BASE_DIR, "input", "TVR Output.xlsx")
+
+class FixedTVRSource(TVRSource):
+    """Same TVR for every channel that is asked for."""
+
+    name = "fixed"
+
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        return pd.DataFrame([{"Channel": channel, "TVRs": 1.5} for channel in split_channels(channels)],
+                            columns=["Channel", "TVRs"])
+
+@pytest.fixture(autouse=True)
+def fixed_tvrs():
+    from tvr_processor import set_tvr_source
+    from tvr_cache import tvr_cache
+    set_tvr_source(FixedTVRSource())
+    tvr_cache.clear()
+    yield
+    set_tvr_source(None)
+
+@pytest.fixture
+def input_b():
+    with open(SAMPLE_INPUT_B, "rb") as f:
+        return f.read()
+
+def input_a_with(edits):
+    """The sample Non Cricket Input workbook (bytes) with {(sheet, cell): value} overrides."""
+    wb = load_workbook(SAMPLE_INPUT_A)
+    for (sheet, cell), value in edits.items():
+        wb[sheet][cell] = value
+    buffer = BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+def open_output(data):
+    return load_workbook(BytesIO(data))
@@ -0,0 +1,51 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from conftest import SKELETON_FILE, input_a_with
+
+@pytest.fixture
+def batch(monkeypatch):
+    import batch
+    monkeypatch.setenv("BATCH_WORKERS", "1")
+    batch.shutdown_pool()
+    yield batch
+    batch.shutdown_pool()
+
+def test_batch_after_a_child_died_gets_a_fresh_pool(batch, input_b):
+    pool = batch.get_pool()
+    with pytest.raises(BrokenProcessPool):
+        pool.submit(os._exit, 1).result()
+
+    results = batch.render_batch([("a", input_a_with({}), input_b), ("b", input_a_with({}), input_b)], SKELETON_FILE)
+
+    assert [(item_id, error) for item_id, _, error in results] == [("a", None), ("b", None)]
+    assert all(output for _, output, _ in results)
+    assert batch.get_pool() is not pool
+
+def die(*args):
+    os._exit(1)
+
+def test_child_dying_mid_batch_fails_its_items_and_the_next_batch_recovers(batch, input_b, monkeypatch):
+    input_a = input_a_with({})
+    with monkeypatch.context() as patch:
+        patch.setattr(batch, "render_one_pager", die)
+        pool = batch.get_pool()
+        results = batch.render_batch([("a", input_a, input_b)], SKELETON_FILE)
+    assert results[0][0] == "a" and results[0][1] is None and "terminated abruptly" in results[0][2]
+
+    results = batch.render_batch([("b", input_a, input_b)], SKELETON_FILE)
+    assert results[0][2] is None and results[0][1]
+    assert batch.get_pool() is not pool
+
+@pytest.mark.parametrize("kwargs", [
+    {"data": "items=1", "content_type": "application/x-www-form-urlencoded"},
+    {"data": "{not json", "content_type": "application/json"},
+    {"json": ["not", "an", "object"]},
+])
+def test_batch_endpoint_rejects_non_json_bodies_with_400(kwargs):
+    from app import app
+    response = app.test_client().post("/process_pager_batch", **kwargs)
+    assert response.status_code == 400
+    assert "JSON" in response.get_json()["error"]
@@ -0,0 +1,49 @@
+from input_workbook import PROPERTY_DETAILS, CHANNEL_PLATFORM
+
+from conftest import FixedTVRSource, SKELETON_FILE, input_a_with, open_output
+
+class CountingTVRSource(FixedTVRSource):
+    def __init__(self):
+        self.fetch_calls = 0
+        self.fetch_many_calls = []
+
+    def fetch(self, *query):
+        self.fetch_calls += 1
+        return super().fetch(*query)
+
+    def fetch_many(self, queries):
+        self.fetch_many_calls.append(list(queries))
+        return [FixedTVRSource.fetch(self, *query) for query in queries]
+
+def test_bulk_lookup_uses_one_round_trip_for_the_whole_batch():
+    from tvr_processor import extract_tvr_data_bulk, set_tvr_source
+    source = CountingTVRSource()
+    set_tvr_source(source)
+    inputs = [
+        input_a_with({}),
+        input_a_with({(CHANNEL_PLATFORM, "C6"): None}),
+        input_a_with({(PROPERTY_DETAILS, "B37"): "West Bengal"}),
+        input_a_with({(PROPERTY_DETAILS, "B45"): "n/a"}),
+    ]
+
+    tvrs = extract_tvr_data_bulk(inputs)
+
+    assert source.fetch_calls == 0
+    assert len(source.fetch_many_calls) == 1
+    # The third item repeats the first one's India query; the invalid item makes no query
+    assert len(source.fetch_many_calls[0]) == 5
+    assert tvrs[0] == [1.5, 1.5, 1.5, 1.5]
+    assert tvrs[1] == [1.5, 0, 1.5, 0]
+    assert tvrs[2] == [1.5, 1.5, 1.5, 1.5]
+    assert tvrs[3] == []
+
+def test_precomputed_tvrs_skip_the_lookup(input_b):
+    from mbs import process_excel_data
+    from tvr_processor import set_tvr_source
+    source = CountingTVRSource()
+    set_tvr_source(source)
+
+    output = process_excel_data(input_a_with({}), input_b, SKELETON_FILE, tvrs=[2.0, 3.0, 4.0, 5.0])
+
+    assert source.fetch_calls == 0 and source.fetch_many_calls == []
+    assert open_output(output).worksheets[1]["I28"].value == 2.0
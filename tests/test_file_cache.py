@@ -0,0 +1,46 @@
+import os
+import threading
+import time
+
+from file_cache import VersionedCache, file_version
+
+def test_loads_once_per_file_version(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("one")
+    loads = []
+    cache = VersionedCache(lambda p, version: loads.append(version) or open(p).read(), "test data")
+
+    assert cache.get(str(path)) == "one"
+    assert cache.get(str(path)) == "one"
+    assert loads == [file_version(str(path))]
+
+    path.write_text("two!")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert cache.get(str(path)) == "two!"
+    assert len(loads) == 2
+
+    cache.clear()
+    assert cache.get(str(path)) == "two!"
+    assert len(loads) == 3
+
+def test_concurrent_first_requests_share_one_load(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text("x")
+    loads = []
+
+    def slow_loader(p, version):
+        loads.append(version)
+        time.sleep(0.05)
+        return object()
+
+    cache = VersionedCache(slow_loader, "test data")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(str(path)))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert len(set(map(id, results))) == 1
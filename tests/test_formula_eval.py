@@ -0,0 +1,87 @@
+from io import BytesIO
+
+import pytest
+from openpyxl import Workbook, load_workbook
+
+from formula_eval import Evaluator, load_model, DIV0, VALUE, NAME, REF
+
+from conftest import SKELETON_FILE, SAMPLE_INPUT_A
+
+def test_default_output_opens_with_computed_formula_values(input_b):
+    import mbs
+    assert mbs.EVALUATE_FORMULAS and mbs.OUTPUT_WRITER == "xml"
+    with open(SAMPLE_INPUT_A, "rb") as f:
+        output = mbs.process_excel_data(f.read(), input_b, SKELETON_FILE)
+
+    formulas = load_workbook(BytesIO(output))
+    values = load_workbook(BytesIO(output), data_only=True)
+    formula_cells = [(ws.title, cell.coordinate) for ws in formulas.worksheets[:2]
+                     for row in ws.iter_rows() for cell in row if cell.data_type == "f"]
+    assert formula_cells
+    missing = [key for key in formula_cells if values[key[0]][key[1]].value is None]
+    assert missing == []
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    wb = Workbook()
+    data = wb.active
+    data.title = "Data"
+    data["A1"] = 10
+    data["A2"] = 4
+    data["B1"] = "=A1*2"
+    data.merge_cells("D1:E1")
+    wb.create_sheet("Other Sheet")["A1"] = 7
+    path = tmp_path_factory.mktemp("formula_eval") / "model.xlsx"
+    wb.save(path)
+    return load_model(str(path))
+
+def evaluate(model, formula, writes=()):
+    return Evaluator(model, list(writes) + [(0, "Z1", formula)]).value(0, "Z1")
+
+@pytest.mark.parametrize("formula, expected", [
+    ("=1+2*3", 7),
+    ("=(1+2)*3", 9),
+    ("=2^3^2", 64),            # ^ is left-associative in Excel
+    ("=-2^2", 4),              # unary minus binds tighter than ^
+    ("=2*50%", 1),
+    ("=1+2&3", "33"),          # & below arithmetic
+    ("=1+2=3", True),          # comparison lowest
+    ("=A1-A2/2", 8),
+    ("='Other Sheet'!A1+Data!A2", 11),
+    ("=SUM(A1:A2,B1)*2", 68),
+    ("=ROUND(2.5,0)+ROUND(-2.5,0)", 0),
+    ("=ROUND(2.345,2)", 2.35),
+])
+def test_operator_precedence(model, formula, expected):
+    assert evaluate(model, formula) == pytest.approx(expected)
+
+def test_request_writes_take_precedence_over_the_skeleton(model):
+    assert evaluate(model, "=B1+1") == 21
+    assert evaluate(model, "=B1+1", [(0, "A1", 1)]) == 3
+    # A write to any cell of a merged range lands on its anchor
+    assert evaluate(model, "=D1", [(0, "E1", 5)]) == 5
+
+@pytest.mark.parametrize("formula, expected", [
+    ("=1/0", DIV0),
+    ("=A1/(A2-4)", DIV0),
+    ('="a"+1', VALUE),
+    ("=NOSUCHFUNC(1)", NAME),
+    ("=1+", NAME),              # syntax errors surface as #NAME?
+    ("=Missing!A1", REF),
+    ("=AVERAGE(C1:C3)", DIV0),  # no numbers to average
+    ("=SUM(A1:A2)+1/0", DIV0),
+    ("=IFERROR(1/0,5)", 5),
+    ("=IFERROR(A1,5)", 10),
+])
+def test_error_values(model, formula, expected):
+    assert evaluate(model, formula) == expected
+
+def test_errors_propagate_through_references_and_ranges(model):
+    writes = [(0, "C1", "=1/0")]
+    assert evaluate(model, "=C1*2", writes) == DIV0
+    assert evaluate(model, "=SUM(C1:C2)", writes) == DIV0
+    assert evaluate(model, "=C1&\"x\"", writes) == DIV0
+
+def test_circular_reference_is_ref_error(model):
+    evaluator = Evaluator(model, [(0, "C1", "=C2+1"), (0, "C2", "=C1+1")])
+    assert evaluator.value(0, "C1") == REF
@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string
+
+from input_workbook import PROPERTY_DETAILS, CHANNEL_PLATFORM, load_input_sheets
+
+from conftest import FixedTVRSource, input_a_with
+
+class RecordingTVRSource(FixedTVRSource):
+    def __init__(self):
+        self.channels = []
+
+    def fetch(self, channels, *query):
+        self.channels.append(channels)
+        return super().fetch(channels, *query)
+
+@pytest.mark.parametrize("reader", ["sparse", "pandas"])
+def test_blank_hd_channel_is_not_queried(reader):
+    from tvr_processor import TVR_INPUT_CELLS, extract_tvr_data, set_tvr_source
+    source = RecordingTVRSource()
+    set_tvr_source(source)
+    sheets = load_input_sheets(input_a_with({(CHANNEL_PLATFORM, "C6"): None}), TVR_INPUT_CELLS, reader=reader)
+
+    tvrs = extract_tvr_data(sheets)
+
+    assert source.channels == ["STAR MAA", "STAR MAA"]
+    assert tvrs == [1.5, 0, 1.5, 0]
+
+def test_sparse_reader_matches_pandas_on_addressed_cells():
+    from mbs import INPUT_CELLS
+    data = input_a_with({(CHANNEL_PLATFORM, "C6"): None, (PROPERTY_DETAILS, "B3"): None})
+    sparse = load_input_sheets(data, INPUT_CELLS, reader="sparse")
+    full = load_input_sheets(data, INPUT_CELLS, reader="pandas")
+    for sheet, refs in INPUT_CELLS.items():
+        for ref in refs:
+            column, row = coordinate_from_string(ref)
+            a = sparse[sheet].iloc[row - 1, column_index_from_string(column) - 1]
+            b = full[sheet].iloc[row - 1, column_index_from_string(column) - 1]
+            assert a == b or (pd.isna(a) and pd.isna(b)), (sheet, ref, a, b)
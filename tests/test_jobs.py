@@ -0,0 +1,31 @@
+import time
+
+from admission import Lane
+from jobs import JobRunner, DONE, QUEUED
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate() and time.time() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_finished_jobs_are_capped_oldest_first():
+    runner = JobRunner(workers=1, queue_size=10, max_retained=3)
+    job_ids = [runner.submit(lambda n=n: n) for n in range(5)]
+    assert _wait_for(lambda: runner.queue_depth() == 0 and runner._queue.unfinished_tasks == 0)
+
+    assert [runner.get(job_id) is not None for job_id in job_ids] == [False, False, True, True, True]
+    assert runner.get(job_ids[-1])["result"] == 4
+
+def test_jobs_wait_for_a_render_lane_slot():
+    lane = Lane("render", limit=1, queue_size=1, wait_seconds=0.05)
+    runner = JobRunner(workers=1, queue_size=10, lane=lane)
+
+    with lane.admit():
+        job_id = runner.submit(lambda: "rendered")
+        time.sleep(0.3)
+        assert runner.get(job_id)["status"] == QUEUED
+        assert lane.in_flight == 1
+    assert _wait_for(lambda: runner.get(job_id)["status"] == DONE)
+    assert runner.get(job_id)["result"] == "rendered"
+    assert lane.in_flight == 0
@@ -0,0 +1,48 @@
+import logging
+from copy import copy
+from datetime import datetime
+
+from conftest import SKELETON_FILE, input_a_with, open_output
+from input_workbook import PROPERTY_DETAILS
+from skeleton_template import acquire_template, release_template, clear_pool
+
+def test_reset_restores_styles_hyperlinks_and_comments():
+    clear_pool()
+    template = acquire_template(SKELETON_FILE)
+    ws = template.workbook.worksheets[1]
+    original_format = ws["E10"].number_format
+    original_bold = ws["E10"].font.b
+    ws["E10"] = datetime(2025, 3, 8, 19, 30)
+    ws["E10"].hyperlink = "https://example.com"
+    bold = copy(ws["E10"].font)
+    bold.b = not original_bold
+    ws["E10"].font = bold
+    release_template(template)
+
+    reused = acquire_template(SKELETON_FILE)
+    assert reused is template
+    cell = reused.workbook.worksheets[1]["E10"]
+    assert cell.number_format == original_format
+    assert cell.hyperlink is None
+    assert cell.font.b == original_bold
+    release_template(reused)
+
+def test_date_request_does_not_leak_format_into_next_request(input_b, monkeypatch, caplog):
+    import mbs
+    from mbs import process_excel_data, ONE_PAGER
+    # Both requests must fill the pooled openpyxl template (the xml writer never touches it)
+    monkeypatch.setattr(mbs, "OUTPUT_WRITER", "openpyxl")
+    caplog.set_level(logging.INFO, logger="skeleton_template")
+    clear_pool()
+    dated = input_a_with({(PROPERTY_DETAILS, "B7"): datetime(2025, 3, 8, 19, 30)})
+    numeric = input_a_with({(PROPERTY_DETAILS, "B7"): 5})
+
+    first = open_output(process_excel_data(dated, input_b, SKELETON_FILE)).worksheets[ONE_PAGER]["E10"]
+    assert first.value == datetime(2025, 3, 8, 19, 30)
+
+    second = open_output(process_excel_data(numeric, input_b, SKELETON_FILE)).worksheets[ONE_PAGER]["E10"]
+    assert second.value == 5
+    assert not second.is_date
+    # The second request filled the template the first one released
+    loads = [r for r in caplog.records if r.getMessage().startswith("Loading skeleton template")]
+    assert len(loads) == 1
@@ -0,0 +1,26 @@
+import pandas as pd
+from sqlalchemy import create_engine
+
+def test_sqlserver_fetch_binds_workbook_values_as_parameters(monkeypatch):
+    import tvr_processor
+    calls = []
+    monkeypatch.setattr(tvr_processor, "execute_sql_with_retry",
+                        lambda sql, params, region: calls.append((sql, params)) or pd.DataFrame())
+
+    tvr_processor.SqlServerSource().fetch("STAR MAA", "Kaun Banega Crorepati's Night", "AP / Telangana",
+                                          "M 22-40 ABCDE", "202409", "202410")
+
+    (sql, params), = calls
+    assert "Crorepati" not in str(sql) and "STAR MAA" not in str(sql)
+    assert params["program"] == "Kaun Banega Crorepati's Night"
+    assert (params["start_period"], params["end_period"]) == (202409, 202410)
+
+def test_procedure_sql_runs_with_bound_parameters():
+    # SQLite stands in for SQL Server: the bound statement round-trips an apostrophe intact
+    import tvr_processor
+    sql = str(tvr_processor.PROCEDURE_SQL).replace("EXEC [dbo].[Get_TVRs_For_Program_PR289PropOnePager]", "SELECT")
+    with create_engine("sqlite://").connect() as connection:
+        row = pd.read_sql_query(tvr_processor.text(sql), connection, params={
+            "channels": "A,B", "program": "It's On", "region": "India", "demographic": "CS 2+",
+            "start_period": 202401, "end_period": 202402}).iloc[0].tolist()
+    assert row == ["A,B", "It's On", "India", "CS 2+", 202401, 202402]
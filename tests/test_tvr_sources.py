@@ -0,0 +1,15 @@
+import pytest
+
+from tvr_sources import TVRSource
+
+def test_source_without_fetch_fails_when_built():
+    class Incomplete(TVRSource):
+        name = "incomplete"
+
+    with pytest.raises(TypeError, match="fetch"):
+        Incomplete()
+
+def test_fetch_many_defaults_to_one_fetch_per_query():
+    from conftest import FixedTVRSource
+    results = FixedTVRSource().fetch_many([("A,B", "P", "India", "CS 2+", "202401", "202401")])
+    assert results[0]["Channel"].tolist() == ["A", "B"]
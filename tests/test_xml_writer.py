@@ -0,0 +1,41 @@
+import pytest
+
+from conftest import SKELETON_FILE, input_a_with, open_output
+from input_workbook import CHANNEL_PLATFORM
+from xml_writer import _cell_xml
+
+def _cells(data):
+    """{(sheet, ref): (value, resolved style)} for every cell of a rendered workbook."""
+    cells = {}
+    for ws in open_output(data).worksheets:
+        for row in ws.iter_rows():
+            for cell in row:
+                style = (cell.number_format, repr(cell.font), repr(cell.fill), repr(cell.border),
+                         repr(cell.alignment), repr(cell.protection))
+                cells[(ws.title, cell.coordinate)] = (cell.value, style)
+    return cells
+
+def _render(monkeypatch, writer, input_a, input_b):
+    import mbs
+    monkeypatch.setattr(mbs, "OUTPUT_WRITER", writer)
+    return mbs.process_excel_data(input_a, input_b, SKELETON_FILE)
+
+@pytest.mark.parametrize("edits", [
+    {},
+    {(CHANNEL_PLATFORM, "C6"): None},
+], ids=["sample", "blank_hd_channel"])
+def test_xml_writer_matches_openpyxl_cell_by_cell(monkeypatch, input_b, edits):
+    input_a = input_a_with(edits)
+    expected = _cells(_render(monkeypatch, "openpyxl", input_a, input_b))
+    actual = _cells(_render(monkeypatch, "xml", input_a, input_b))
+
+    assert actual.keys() == expected.keys()
+    differences = {key: (expected[key], actual[key]) for key in expected if expected[key] != actual[key]}
+    assert differences == {}
+
+def test_blank_strings_are_empty_cells():
+    assert _cell_xml("C22", "7", "", None) == '<c r="C22" s="7"/>'
+    assert _cell_xml("C22", None, None, None) == '<c r="C22"/>'
+
+def test_error_codes_are_error_cells():
+    assert _cell_xml("A1", None, "#N/A", None) == '<c r="A1" t="e"><v>#N/A</v></c>'
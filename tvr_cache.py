@@ -0,0 +1,122 @@
+import pandas as pd
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import closing
+
+from metrics import register_stats
+
+logger = logging.getLogger(__name__)
+
+# In-memory LRU entries, on-disk SQLite file ("" disables the disk tier) and entry lifetime
+TVR_CACHE_SIZE = int(os.environ.get("TVR_CACHE_SIZE", "256"))
+TVR_CACHE_PATH = os.environ.get("TVR_CACHE_PATH", os.path.join(tempfile.gettempdir(), "tvr_cache.sqlite3"))
+TVR_CACHE_TTL_SECONDS = int(os.environ.get("TVR_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+def cache_key(channels, program, region, demographic, start_period, end_period, source="sqlserver"):
+    """Key for one TVR query; every argument that changes the result is part of it.
+
+    Non-production sources are namespaced so a local mirror never answers for SQL Server.
+    """
+    key = [channels, program, region, demographic, str(start_period), str(end_period)]
+    if source != "sqlserver":
+        key.append(source)
+    return json.dumps(key)
+
+class TVRCache:
+    """Two-tier cache of TVR query results: an LRU dict in front of a SQLite table.
+
+    Values are the DataFrames returned by the stored procedure. Entries expire
+    after ``ttl`` seconds in both tiers so the open week is eventually refreshed.
+    """
+
+    def __init__(self, size=TVR_CACHE_SIZE, path=TVR_CACHE_PATH, ttl=TVR_CACHE_TTL_SECONDS):
+        self.size = size
+        self.path = path
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+        if self.path:
+            try:
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("CREATE TABLE IF NOT EXISTS tvr_cache "
+                                 "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, data TEXT NOT NULL)")
+            except sqlite3.Error as e:
+                logger.warning(f"TVR disk cache disabled ({self.path}): {e}")
+                self.path = ""
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def _count(self, stat):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, key):
+        """Return a cached DataFrame for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, df = entry
+                if now - stored_at < self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return df.copy()
+                del self._memory[key]
+
+        if self.path:
+            try:
+                with closing(self._connect()) as conn, conn:
+                    row = conn.execute("SELECT stored_at, data FROM tvr_cache WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"TVR disk cache read failed: {e}")
+                row = None
+            if row is not None and now - row[0] < self.ttl:
+                df = pd.DataFrame(json.loads(row[1]))
+                self._remember(key, row[0], df)
+                self._count("disk_hits")
+                return df.copy()
+
+        self._count("misses")
+        return None
+
+    def put(self, key, df):
+        """Store a non-empty query result in both tiers."""
+        if df is None or df.empty:
+            return
+        stored_at = time.time()
+        self._remember(key, stored_at, df.copy())
+        if self.path:
+            try:
+                data = df.to_json(orient="records")
+                with closing(self._connect()) as conn, conn:
+                    conn.execute("INSERT OR REPLACE INTO tvr_cache (key, stored_at, data) VALUES (?, ?, ?)",
+                                 (key, stored_at, data))
+                    conn.execute("DELETE FROM tvr_cache WHERE stored_at < ?", (stored_at - self.ttl,))
+            except sqlite3.Error as e:
+                logger.warning(f"TVR disk cache write failed: {e}")
+        self._count("stores")
+
+    def _remember(self, key, stored_at, df):
+        with self._lock:
+            self._memory[key] = (stored_at, df)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.size:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            with closing(self._connect()) as conn, conn:
+                conn.execute("DELETE FROM tvr_cache")
+
+tvr_cache = TVRCache()
+register_stats("onepager_tvr_cache_events_total", "TVR cache lookups and stores.", tvr_cache.stats, "event")
@@ -1,193 +1,481 @@
 import pandas as pd
 from sqlalchemy import create_engine, text
-from datetime import datetime
+import logging
 import os
-
-def extract_tvr_data(input_excel_filename):
+import random
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import quote_plus
+
+from diagnostics import diagnostics_sink
+from metrics import timed_stage, db_retries_total, db_failures_total
+from tvr_cache import tvr_cache, cache_key
+from tvr_sources import TVR_SOURCE, TVR_LOCAL_PATH, TVRSource, SQLiteRatingsSource, ParquetRatingsSource
+from input_workbook import PROPERTY_DETAILS, CHANNEL_PLATFORM, read_input, load_input_sheets, is_input_sheets
+
+logger = logging.getLogger(__name__)
+
+# Input cells extract_tvr_data reads (program, demographic, region, time period, channels)
+TVR_INPUT_CELLS = {
+    PROPERTY_DETAILS: ["B1", "B36", "B37", "B45"],
+    CHANNEL_PLATFORM: ["C5", "C6"],
+}
+
+# SQL Connection
+SQL_SERVER = os.environ.get("TVR_SQL_SERVER", 'MUMSQLP01113\\GRMINDSQL13')
+SQL_DATABASE = os.environ.get("TVR_SQL_DATABASE", 'BARC_RATINGS')
+SQL_USERNAME = os.environ.get("TVR_SQL_USERNAME", 'GRMINRatRO')
+SQL_PASSWORD = os.environ.get("TVR_SQL_PASSWORD", 'GRMINRatRO')
+SQL_DRIVER = os.environ.get("TVR_SQL_DRIVER", 'ODBC Driver 17 for SQL Server')
+
+# Connection pool shared by every request in this worker process
+SQL_POOL_SIZE = int(os.environ.get("TVR_SQL_POOL_SIZE", "4"))
+SQL_MAX_OVERFLOW = int(os.environ.get("TVR_SQL_MAX_OVERFLOW", "4"))
+SQL_POOL_RECYCLE_SECONDS = int(os.environ.get("TVR_SQL_POOL_RECYCLE_SECONDS", "1800"))
+SQL_POOL_WARMUP = int(os.environ.get("TVR_SQL_POOL_WARMUP", "2"))
+SQL_MAX_ATTEMPTS = int(os.environ.get("TVR_SQL_MAX_ATTEMPTS", "3"))
+SQL_RETRY_BACKOFF_SECONDS = float(os.environ.get("TVR_SQL_RETRY_BACKOFF_SECONDS", "0.5"))
+
+# Global temp tables left behind by Get_TVRs_For_Program_PR289PropOnePager
+TEMP_TABLES = ['##temp_Channels', '##temp_Programs']
+CLEANUP_SQL = "; ".join(f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}" for table in TEMP_TABLES)
+# Server-wide application lock held around cleanup + EXEC so no two sessions (threads, workers or
+# instances) share those tables at once; remove once the procedure moves to session-local #temp tables
+PROCEDURE_LOCK = os.environ.get("TVR_SQL_PROCEDURE_LOCK", "Get_TVRs_For_Program_PR289PropOnePager")
+PROCEDURE_LOCK_TIMEOUT_MS = int(os.environ.get("TVR_SQL_PROCEDURE_LOCK_TIMEOUT_MS", "60000"))
+
+# Single TVR query; workbook values are always bound as parameters, never inlined
+PROCEDURE_SQL = text("EXEC [dbo].[Get_TVRs_For_Program_PR289PropOnePager] "
+                     ":channels, :program, :region, :demographic, :start_period, :end_period")
+
+# Procedure calls sent per round trip by fetch_tvrs_bulk, and the column marking each call's results
+BULK_CHUNK_SIZE = int(os.environ.get("TVR_BULK_CHUNK_SIZE", "25"))
+BULK_MARKER = "tvr_bulk_query_index"
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def connection_string():
+    return (f"mssql+pyodbc://{SQL_USERNAME}:{quote_plus(SQL_PASSWORD)}@{SQL_SERVER}/{SQL_DATABASE}"
+            f"?driver={SQL_DRIVER.replace(' ', '+')}")
+
+def get_engine():
+    """Process-wide pooled engine, created on first use and kept for the worker's lifetime."""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            logger.info("Creating pooled DB engine...")
+            _engine = create_engine(
+                connection_string(),
+                pool_size=SQL_POOL_SIZE,
+                max_overflow=SQL_MAX_OVERFLOW,
+                pool_pre_ping=True,
+                pool_recycle=SQL_POOL_RECYCLE_SECONDS,
+            )
+        return _engine
+
+def warm_up_pool(connections=SQL_POOL_WARMUP):
+    """Open ``connections`` pooled connections up front so the first requests skip the ODBC login."""
     try:
-        current_dir = os.getcwd()
-        input_excel_path = os.path.join(current_dir, input_excel_filename)
-
-        if not os.path.exists(input_excel_path):
-            print(f"❌ Error: File '{input_excel_filename}' not found in {current_dir}")
-            return []
-
-        print(f"📄 Reading parameters from: {input_excel_path}")
-
-        # Read needed cells
-        sheet1 = pd.read_excel(input_excel_path, sheet_name='Property Details', header=None, usecols=[1], nrows=50)
-        sheet2 = pd.read_excel(input_excel_path, sheet_name='Channel & Platform Details', header=None, usecols=[2], nrows=10)
-
-        program = str(sheet1.iloc[0, 0]).strip() if sheet1.shape[0] > 0 else None
-        region = str(sheet1.iloc[36, 0]).strip() if sheet1.shape[0] > 36 else None
-        demographic = str(sheet1.iloc[35, 0]).strip() if sheet1.shape[0] > 35 else None
-        time_period = str(sheet1.iloc[44, 0]).strip() if sheet1.shape[0] > 44 else None
-
-        channel_regular = str(sheet2.iloc[4, 0]).strip() if sheet2.shape[0] > 4 else None
-        channel_hd = str(sheet2.iloc[5, 0]).strip() if sheet2.shape[0] > 5 else None
-
-        channels = f"{channel_regular},{channel_hd}" if channel_hd and str(channel_hd).lower() != 'nan' else channel_regular
-
-        missing = []
-        for key, value in [('Program', program), ('Region', region), ('Demographic', demographic),
-                           ('Time Period', time_period), ('Channels', channels)]:
-            if not value or value.lower() == 'nan':
-                missing.append(key)
-
-        if missing:
-            print(f"❌ Error: Missing required fields: {', '.join(missing)}.")
-            return []
-
-        print(f"✅ Extracted:\n - Program: {program}\n - Region: {region}\n - Demographic: {demographic}\n"
-              f" - Time Period: {time_period}\n - Channels: {channels}")
-        print(f" - Regular Channel: {channel_regular}\n - HD Channel: {channel_hd or 'Not provided'}")
-
-        # Parse time period
-        if '-' in time_period:
-            start_period, end_period = time_period.split('-')
+        engine = get_engine()
+        opened = [engine.connect() for _ in range(min(connections, SQL_POOL_SIZE))]
+        for connection in opened:
+            connection.close()
+        logger.info(f"Warmed up {len(opened)} DB connection(s)")
+        return len(opened)
+    except Exception as e:
+        logger.warning(f"DB pool warm-up failed (non-critical): {str(e)}")
+        return 0
+
+def dispose_engine():
+    """Close every pooled connection, e.g. after fork or on shutdown."""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+            logger.info("DB connection pool closed")
+
+def clean_temp_tables(connection):
+    """Drop leftover global temp tables in one round trip."""
+    try:
+        logger.debug("Cleaning up any existing temporary tables...")
+        with connection.begin():
+            connection.execute(text(CLEANUP_SQL))
+        return True
+    except Exception as e:
+        logger.warning(f"Cleanup warning (non-critical): {str(e)}")
+        return False
+
+def run_with_retry(operation, label):
+    """Run ``operation(connection)`` on a pooled connection, retrying with exponential backoff and jitter."""
+    for attempt in range(1, SQL_MAX_ATTEMPTS + 1):
+        try:
+            with get_engine().connect() as connection:
+                try:
+                    logger.debug(f"Attempt {attempt} for {label} query...")
+                    return operation(connection)
+                except Exception:
+                    # Don't hand a possibly broken connection back to the pool
+                    connection.invalidate()
+                    raise
+        except Exception as e:
+            logger.warning(f"Attempt {attempt} for {label} failed: {str(e)}")
+            if attempt == SQL_MAX_ATTEMPTS:
+                db_failures_total.inc()
+                raise
+            db_retries_total.inc()
+            delay = SQL_RETRY_BACKOFF_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+            logger.debug(f"Retrying in {delay:.1f}s...")
+            time.sleep(delay)
+
+@contextmanager
+def procedure_lock(connection):
+    """Hold PROCEDURE_LOCK (sp_getapplock, session-owned) on ``connection`` for the block."""
+    if not PROCEDURE_LOCK:
+        yield
+        return
+    with connection.begin():
+        result = connection.execute(
+            text("DECLARE @result int; "
+                 "EXEC @result = sp_getapplock @Resource = :resource, @LockMode = 'Exclusive', "
+                 "@LockOwner = 'Session', @LockTimeout = :timeout; SELECT @result"),
+            {"resource": PROCEDURE_LOCK, "timeout": PROCEDURE_LOCK_TIMEOUT_MS},
+        ).scalar()
+    if result is None or result < 0:
+        raise RuntimeError(f"Could not acquire procedure lock '{PROCEDURE_LOCK}' (sp_getapplock returned {result})")
+    try:
+        yield
+    finally:
+        try:
+            if connection.in_transaction():
+                connection.rollback()
+            with connection.begin():
+                connection.execute(text("EXEC sp_releaseapplock @Resource = :resource, @LockOwner = 'Session'"),
+                                   {"resource": PROCEDURE_LOCK})
+        except Exception as e:
+            # A failed connection is invalidated by run_with_retry, which ends the session and its lock
+            logger.warning(f"Could not release procedure lock '{PROCEDURE_LOCK}': {str(e)}")
+
+def execute_sql_with_retry(sql, params, region_name):
+    def operation(connection):
+        with procedure_lock(connection):
+            clean_temp_tables(connection)
+            return pd.read_sql_query(sql, connection, params=params)
+    return run_with_retry(operation, region_name)
+
+def _bulk_batch_sql(count):
+    """One batch running the procedure ``count`` times, each preceded by temp-table cleanup
+    and a marker result set so the results can be split back per query."""
+    statements = ["SET NOCOUNT ON;"]
+    for _ in range(count):
+        statements.append(CLEANUP_SQL + ";")
+        statements.append(f"SELECT ? AS {BULK_MARKER};")
+        statements.append("EXEC [dbo].[Get_TVRs_For_Program_PR289PropOnePager] ?, ?, ?, ?, ?, ?;")
+    return "\n".join(statements)
+
+def _read_bulk_results(cursor, count):
+    """Split a multi-result-set batch into one DataFrame per query, keyed by marker index."""
+    results = {}
+    current = None
+    while True:
+        if cursor.description is not None:
+            columns = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+            if columns == [BULK_MARKER]:
+                current = int(rows[0][0])
+                results[current] = pd.DataFrame()
+            elif current is not None and 'Channel' in columns:
+                # Keep the last (Channel, TVRs) result set the procedure produced
+                results[current] = pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns)
+        if not cursor.nextset():
+            break
+    return [results.get(index, pd.DataFrame()) for index in range(count)]
+
+class SqlServerSource(TVRSource):
+    """Production backend: the BARC ratings stored procedure on SQL Server."""
+
+    name = "sqlserver"
+
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        params = {"channels": channels, "program": program, "region": region, "demographic": demographic,
+                  "start_period": int(start_period), "end_period": int(end_period)}
+        return execute_sql_with_retry(PROCEDURE_SQL, params, region)
+
+    def fetch_many(self, queries):
+        """Run every query through parameterized EXECs, BULK_CHUNK_SIZE per round trip."""
+        results = []
+        for offset in range(0, len(queries), BULK_CHUNK_SIZE):
+            chunk = queries[offset:offset + BULK_CHUNK_SIZE]
+            sql = _bulk_batch_sql(len(chunk))
+            params = []
+            for index, (channels, program, region, demographic, start_period, end_period) in enumerate(chunk):
+                params.extend([index, channels, program, region, demographic, int(start_period), int(end_period)])
+
+            def operation(connection):
+                with procedure_lock(connection):
+                    cursor = connection.connection.cursor()
+                    try:
+                        cursor.execute(sql, params)
+                        return _read_bulk_results(cursor, len(chunk))
+                    finally:
+                        cursor.close()
+
+            results.extend(run_with_retry(operation, f"bulk ({len(chunk)} queries)"))
+        return results
+
+    def warm_up(self):
+        return warm_up_pool()
+
+_source = None
+_source_lock = threading.Lock()
+
+def fetch_tvrs_bulk(queries):
+    """Resolve many TVR queries at once.
+
+    ``queries`` is a list of (channels, program, region, demographic,
+    start_period, end_period) tuples. Cached and duplicate queries are only
+    answered once; the rest go to the source's ``fetch_many`` (a few batched
+    round trips on SQL Server). Returns {query tuple: DataFrame of Channel, TVRs}.
+    """
+    source = get_tvr_source()
+    found = {}
+    misses = []
+    for query in queries:
+        normalised = tuple(str(part) for part in query)
+        if normalised in found or normalised in misses:
+            continue
+        df = tvr_cache.get(cache_key(*normalised, source.name))
+        if df is not None:
+            found[normalised] = df
         else:
-            start_period = end_period = time_period
-
-        start_period = ''.join(filter(str.isdigit, start_period))
-        end_period = ''.join(filter(str.isdigit, end_period))
-
-        if not start_period or not end_period:
-            print(f"❌ Error: Invalid Time Period format '{time_period}'.")
-            return []
-
-        # SQL Connection
-        server = 'MUMSQLP01113\\GRMINDSQL13'
-        database = 'BARC_RATINGS'
-        username = 'GRMINRatRO'
-        password = 'GRMINRatRO'
-        driver = 'ODBC Driver 17 for SQL Server'
-
-        connection_string = f"mssql+pyodbc://{username}:{password}@{server}/{database}?driver={driver.replace(' ', '+')}"
-
-        print("🔗 Connecting to DB...")
-        engine = create_engine(connection_string)
-
-        def extract_tvr_for_channel(df, channel_name, region_name):
-            if df.empty:
-                print(f"⚠️ No data found for {channel_name} in {region_name}.")
-                return 0
-            channel_df = df[df['Channel'] == channel_name]
-            if channel_df.empty:
-                print(f"⚠️ No data found for {channel_name} in {region_name}.")
-                return 0
-            if 'TVRs' in channel_df.columns:
-                tvr_value = channel_df['TVRs'].values[0]
-                return tvr_value
+            misses.append(normalised)
+
+    if misses:
+        logger.info(f"Bulk TVR lookup: {len(misses)} queries ({len(found)} cached)")
+        for normalised, df in zip(misses, source.fetch_many(misses)):
+            tvr_cache.put(cache_key(*normalised, source.name), df)
+            found[normalised] = df
+    return {query: found[tuple(str(part) for part in query)] for query in queries}
+
+def get_tvr_source():
+    """The TVR backend selected by TVR_SOURCE, created once per process."""
+    global _source
+    with _source_lock:
+        if _source is None:
+            if TVR_SOURCE == "sqlserver":
+                _source = SqlServerSource()
+            elif TVR_SOURCE == "sqlite":
+                _source = SQLiteRatingsSource(TVR_LOCAL_PATH)
+            elif TVR_SOURCE == "parquet":
+                _source = ParquetRatingsSource(TVR_LOCAL_PATH)
             else:
-                print(f"⚠️ TVRs column not found for {channel_name} in {region_name}.")
-                return 0
-
-        def clean_temp_tables(connection):
-            try:
-                print("🧹 Cleaning up any existing temporary tables...")
-                temp_tables = ['##temp_Channels', '##temp_Programs']
-                for table in temp_tables:
-                    cleanup_sql = f"IF OBJECT_ID('tempdb..{table}') IS NOT NULL DROP TABLE {table}"
-                    with connection.begin():
-                        connection.execute(text(cleanup_sql))
-                        print(f"  - Cleaned up {table} if it existed")
-                return True
-            except Exception as e:
-                print(f"⚠️ Cleanup warning (non-critical): {str(e)}")
-                return False
-
-        def execute_sql_with_retry(sql, region_name):
-            max_attempts = 3
-            for attempt in range(1, max_attempts+1):
-                try:
-                    with engine.connect() as connection:
-                        clean_temp_tables(connection)
-                        print(f"  Attempt {attempt} for {region_name} query...")
-                        df = pd.read_sql_query(sql, connection)
-                        return df
-                except Exception as e:
-                    print(f"  ⚠️ Attempt {attempt} failed: {str(e)}")
-                    if attempt == max_attempts:
-                        raise
-                    print("  Retrying with a fresh connection...")
-            return pd.DataFrame()
-
-        # Query for specified region
-        print(f"▶️ Querying for {region}...")
-        sql_query_region = f"""
-        exec [dbo].[Get_TVRs_For_Program_PR289PropOnePager]
-            '{channels}',
-            '{program}',
-            '{region}',
-            '{demographic}',
-            {start_period},
-            {end_period}
-        """
-        df_region = execute_sql_with_retry(sql_query_region, region)
-
-        region_regular_tvr = extract_tvr_for_channel(df_region, channel_regular, region)
-        region_hd_tvr = 0
-        if channel_hd and str(channel_hd).lower() != 'nan':
-            region_hd_tvr = extract_tvr_for_channel(df_region, channel_hd, region)
-
-        print(f" Retrieved TVR for {channel_regular} in {region}: {region_regular_tvr}")
-        if channel_hd and str(channel_hd).lower() != 'nan':
-            print(f" Retrieved TVR for {channel_hd} in {region}: {region_hd_tvr}")
-
-        # Query for India
-        print(f"▶️ Querying for India...")
-        sql_query_india = f"""
-        exec [dbo].[Get_TVRs_For_Program_PR289PropOnePager]
-            '{channels}',
-            '{program}',
-            'India',
-            '{demographic}',
-            {start_period},
-            {end_period}
-        """
-        df_india = execute_sql_with_retry(sql_query_india, "India")
-
-        india_regular_tvr = extract_tvr_for_channel(df_india, channel_regular, "India")
-        india_hd_tvr = 0
-        if channel_hd and str(channel_hd).lower() != 'nan':
-            india_hd_tvr = extract_tvr_for_channel(df_india, channel_hd, "India")
-
-        print(f" Retrieved TVR for {channel_regular} in India: {india_regular_tvr}")
-        if channel_hd and str(channel_hd).lower() != 'nan':
-            print(f" Retrieved TVR for {channel_hd} in India: {india_hd_tvr}")
-
-        all_tvrs = [region_regular_tvr, region_hd_tvr, india_regular_tvr, india_hd_tvr]
-
-        # Export to Excel (optional, for debugging)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_program = program.replace(' ', '_').replace(',', '_')
-        excel_file = f"{safe_program}_TVR_Data_{timestamp}.xlsx"
-
-        print(f" Exporting TVRs to {excel_file}...")
-
-        export_data = {
-            'Region': [f"{region} ({channel_regular})",
-                       f"{region} ({channel_hd})" if channel_hd and str(channel_hd).lower() != 'nan' else None,
-                       f"India ({channel_regular})",
-                       f"India ({channel_hd})" if channel_hd and str(channel_hd).lower() != 'nan' else None],
-            'Channel': [channel_regular, channel_hd, channel_regular, channel_hd],
-            'TVR_Value': all_tvrs
-        }
-
-        export_df = pd.DataFrame(export_data)
-        export_df = export_df.dropna(subset=['Region'])
-
-        export_df.to_excel(excel_file, index=False)
-        print(f"✅ Saved TVR data: {excel_file}")
-
-        return all_tvrs
+                raise ValueError(f"Unknown TVR_SOURCE '{TVR_SOURCE}' (expected sqlserver, sqlite or parquet)")
+            logger.info(f"Using TVR source: {_source.name}")
+        return _source
+
+def set_tvr_source(source):
+    """Swap the TVR backend at runtime (benchmarks, local mirrors)."""
+    global _source
+    with _source_lock:
+        _source = source
+
+def read_tvr_request(input_excel):
+    """Parameters of the TVR lookup for one Non Cricket Input workbook, or None (reason logged).
+
+    ``input_excel`` is either the sheet dict from ``load_input_sheets`` (so the
+    workbook is only parsed once per request) or a path, bytes or file-like object.
+    """
+    if is_input_sheets(input_excel):
+        input_sheets = input_excel
+        logger.info("Reading parameters from parsed input workbook")
+    else:
+        input_excel = read_input(input_excel)
+        if isinstance(input_excel, str) and not os.path.exists(input_excel):
+            logger.error(f"File '{input_excel}' not found")
+            return None
+        logger.info("Reading parameters from input workbook")
+        input_sheets = load_input_sheets(input_excel, TVR_INPUT_CELLS)
+
+    # Read needed cells
+    sheet1 = input_sheets[PROPERTY_DETAILS]
+    sheet2 = input_sheets[CHANNEL_PLATFORM]
+
+    def cell_text(df, row, col):
+        if df.shape[0] > row and df.shape[1] > col:
+            return str(df.iloc[row, col]).strip()
+        return None
+
+    program = cell_text(sheet1, 0, 1)
+    region = cell_text(sheet1, 36, 1)
+    demographic = cell_text(sheet1, 35, 1)
+    time_period = cell_text(sheet1, 44, 1)
+
+    channel_regular = cell_text(sheet2, 4, 2)
+    channel_hd = cell_text(sheet2, 5, 2)
+    if not channel_hd or str(channel_hd).lower() == 'nan':
+        channel_hd = None
+
+    channels = f"{channel_regular},{channel_hd}" if channel_hd else channel_regular
+
+    missing = []
+    for key, value in [('Program', program), ('Region', region), ('Demographic', demographic),
+                       ('Time Period', time_period), ('Channels', channels)]:
+        if not value or value.lower() == 'nan':
+            missing.append(key)
+
+    if missing:
+        logger.error(f"Missing required fields: {', '.join(missing)}.")
+        return None
+
+    logger.info(f"Extracted program={program!r} region={region!r} demographic={demographic!r} "
+                f"time_period={time_period!r} channels={channels!r}")
+    logger.debug(f"Regular channel: {channel_regular}; HD channel: {channel_hd or 'Not provided'}")
+
+    # Parse time period
+    if '-' in time_period:
+        start_period, end_period = time_period.split('-')
+    else:
+        start_period = end_period = time_period
+
+    start_period = ''.join(filter(str.isdigit, start_period))
+    end_period = ''.join(filter(str.isdigit, end_period))
+
+    if not start_period or not end_period:
+        logger.error(f"Invalid Time Period format '{time_period}'.")
+        return None
+
+    return {"program": program, "region": region, "demographic": demographic, "time_period": time_period,
+            "channels": channels, "channel_regular": channel_regular, "channel_hd": channel_hd,
+            "start_period": start_period, "end_period": end_period}
+
+def tvr_queries(params):
+    """The (channels, program, region, demographic, start, end) queries for the region and for India."""
+    return [(params["channels"], params["program"], region_name, params["demographic"],
+             params["start_period"], params["end_period"]) for region_name in (params["region"], "India")]
+
+def _channel_tvr(df, channel_name, region_name):
+    if df.empty:
+        logger.warning(f"No data found for {channel_name} in {region_name}.")
+        return 0
+    channel_df = df[df['Channel'] == channel_name]
+    if channel_df.empty:
+        logger.warning(f"No data found for {channel_name} in {region_name}.")
+        return 0
+    if 'TVRs' in channel_df.columns:
+        return channel_df['TVRs'].values[0]
+    logger.warning(f"TVRs column not found for {channel_name} in {region_name}.")
+    return 0
+
+def tvrs_from_results(params, df_region, df_india, source_name):
+    """[region regular, region HD, India regular, India HD] TVRs from the two query results."""
+    region = params["region"]
+    channel_regular = params["channel_regular"]
+    channel_hd = params["channel_hd"]
+
+    region_regular_tvr = _channel_tvr(df_region, channel_regular, region)
+    region_hd_tvr = 0
+    if channel_hd:
+        region_hd_tvr = _channel_tvr(df_region, channel_hd, region)
+
+    logger.debug(f"Retrieved TVR for {channel_regular} in {region}: {region_regular_tvr}")
+    if channel_hd:
+        logger.debug(f"Retrieved TVR for {channel_hd} in {region}: {region_hd_tvr}")
+
+    # India results
+    india_regular_tvr = _channel_tvr(df_india, channel_regular, "India")
+    india_hd_tvr = 0
+    if channel_hd:
+        india_hd_tvr = _channel_tvr(df_india, channel_hd, "India")
+
+    logger.debug(f"Retrieved TVR for {channel_regular} in India: {india_regular_tvr}")
+    if channel_hd:
+        logger.debug(f"Retrieved TVR for {channel_hd} in India: {india_hd_tvr}")
+
+    # Audit record of the TVRs used, written off the request path
+    diagnostics_sink.record("tvr", {
+        "program": params["program"],
+        "region": region,
+        "demographic": params["demographic"],
+        "time_period": params["time_period"],
+        "channels": params["channels"],
+        "source": source_name,
+        "tvrs": [entry for entry in [
+            {"region": region, "channel": channel_regular, "tvr": region_regular_tvr},
+            {"region": region, "channel": channel_hd, "tvr": region_hd_tvr} if channel_hd else None,
+            {"region": "India", "channel": channel_regular, "tvr": india_regular_tvr},
+            {"region": "India", "channel": channel_hd, "tvr": india_hd_tvr} if channel_hd else None,
+        ] if entry],
+    })
+
+    return [region_regular_tvr, region_hd_tvr, india_regular_tvr, india_hd_tvr]
+
+def extract_tvr_data(input_excel):
+    """Look up region and India TVRs for the program in the Non Cricket Input workbook.
+
+    ``input_excel`` is either the sheet dict from ``load_input_sheets`` or a
+    path, bytes or file-like object. Returns [] when the lookup fails.
+    """
+    try:
+        params = read_tvr_request(input_excel)
+        if params is None:
+            return []
+        source = get_tvr_source()
+
+        def query_tvrs(query):
+            region_name = query[2]
+            logger.info(f"Querying for {region_name}...")
+            key = cache_key(*query, source.name)
+            df = tvr_cache.get(key)
+            if df is not None:
+                logger.info(f"TVR cache hit for {region_name}")
+                return df
+            with timed_stage(f"tvr_query_{source.name}"):
+                df = source.fetch(*query)
+            tvr_cache.put(key, df)
+            return df
+
+        region_query, india_query = tvr_queries(params)
+        # Serial on purpose: the procedure's global ##temp tables make every call take
+        # PROCEDURE_LOCK, so issuing the two queries concurrently would not overlap them
+        df_region = query_tvrs(region_query)
+        df_india = query_tvrs(india_query)
+
+        return tvrs_from_results(params, df_region, df_india, source.name)
 
     except Exception as e:
-        print(f"❌ Error: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception(f"TVR extraction failed: {str(e)}")
         return []
-    finally:
-        if 'engine' in locals():
-            engine.dispose()
-            print("🔌DB connection closed. ")
\ No newline at end of file
+
+def extract_tvr_data_bulk(inputs):
+    """``extract_tvr_data`` for many workbooks, resolving every query through one ``fetch_tvrs_bulk``.
+
+    Returns one TVR list per input, in order; [] for inputs whose parameters
+    are invalid or when the bulk lookup fails.
+    """
+    requests = []
+    for input_excel in inputs:
+        try:
+            requests.append(read_tvr_request(input_excel))
+        except Exception as e:
+            logger.exception(f"Could not read TVR parameters: {str(e)}")
+            requests.append(None)
+
+    queries = [query for params in requests if params for query in tvr_queries(params)]
+    try:
+        source = get_tvr_source()
+        with timed_stage(f"tvr_query_bulk_{source.name}"):
+            results = fetch_tvrs_bulk(queries) if queries else {}
+    except Exception as e:
+        logger.exception(f"Bulk TVR lookup failed: {str(e)}")
+        return [[] for _ in inputs]
+
+    tvrs = []
+    for params in requests:
+        if params is None:
+            tvrs.append([])
+            continue
+        region_query, india_query = tvr_queries(params)
+        tvrs.append(tvrs_from_results(params, results[region_query], results[india_query], source.name))
+    return tvrs
@@ -0,0 +1,95 @@
+import pandas as pd
+import abc
+import os
+import sqlite3
+from contextlib import closing
+
+# Which TVR backend extract_tvr_data uses: "sqlserver" (production), "sqlite" or "parquet"
+TVR_SOURCE = os.environ.get("TVR_SOURCE", "sqlserver")
+# Ratings extract for the local backends
+TVR_LOCAL_PATH = os.environ.get("TVR_LOCAL_PATH", "")
+
+# Columns of a local ratings extract: one row per channel/program/region/demographic/week
+EXTRACT_COLUMNS = ["Channel", "Program", "Region", "Demographic", "Week", "TVRs"]
+
+class TVRSource(abc.ABC):
+    """Backend that answers Get_TVRs_For_Program_PR289PropOnePager-style queries.
+
+    ``fetch`` returns a DataFrame with at least ``Channel`` and ``TVRs`` columns,
+    one row per requested channel that has data. Subclasses must implement
+    ``fetch``; one that does not cannot be instantiated.
+    """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        """Average TVRs per channel for one program/region/demographic over the period."""
+
+    def fetch_many(self, queries):
+        """Answer a list of (channels, program, region, demographic, start, end) tuples, in order."""
+        return [self.fetch(*query) for query in queries]
+
+    def warm_up(self):
+        """Prepare connections or load data ahead of the first request."""
+        return 0
+
+def split_channels(channels):
+    return [channel.strip() for channel in str(channels).split(',') if channel.strip()]
+
+def summarise_extract(df, channels, program, region, demographic, start_period, end_period):
+    """Average weekly TVRs per channel over [start_period, end_period] from an extract DataFrame."""
+    weeks = pd.to_numeric(df["Week"], errors="coerce")
+    mask = (
+        df["Channel"].isin(split_channels(channels))
+        & (df["Program"] == program)
+        & (df["Region"] == region)
+        & (df["Demographic"] == demographic)
+        & (weeks >= int(start_period))
+        & (weeks <= int(end_period))
+    )
+    matched = df.loc[mask, ["Channel", "TVRs"]]
+    return matched.groupby("Channel", as_index=False, sort=False)["TVRs"].mean()
+
+class SQLiteRatingsSource(TVRSource):
+    """Local ratings mirror stored in a SQLite table named ``ratings`` (see EXTRACT_COLUMNS)."""
+
+    name = "sqlite"
+
+    def __init__(self, path):
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"SQLite ratings extract not found at: {path}")
+        self.path = path
+
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        names = split_channels(channels)
+        placeholders = ", ".join("?" for _ in names)
+        sql = (f"SELECT Channel, AVG(TVRs) AS TVRs FROM ratings "
+               f"WHERE Channel IN ({placeholders}) AND Program = ? AND Region = ? AND Demographic = ? "
+               f"AND Week BETWEEN ? AND ? GROUP BY Channel")
+        params = names + [program, region, demographic, int(start_period), int(end_period)]
+        with closing(sqlite3.connect(self.path)) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+class ParquetRatingsSource(TVRSource):
+    """Local ratings extract in a Parquet file, loaded once and filtered in memory.
+
+    Needs pyarrow (or fastparquet), which is not part of the production image.
+    """
+
+    name = "parquet"
+
+    def __init__(self, path):
+        if not path or not os.path.exists(path):
+            raise FileNotFoundError(f"Parquet ratings extract not found at: {path}")
+        self.path = path
+        self._df = None
+
+    def warm_up(self):
+        if self._df is None:
+            self._df = pd.read_parquet(self.path, columns=EXTRACT_COLUMNS)
+        return len(self._df)
+
+    def fetch(self, channels, program, region, demographic, start_period, end_period):
+        self.warm_up()
+        return summarise_extract(self._df, channels, program, region, demographic, start_period, end_period)
@@ -0,0 +1,67 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Startup and first-request timings in milliseconds, reported by /ready
+timings = {}
+_lock = threading.Lock()
+_ready = False
+
+@contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+def is_ready():
+    return _ready
+
+def warm_up(skeleton_path):
+    """Import the processing stack and pre-parse every per-worker cache.
+
+    Runs once per process. Under gunicorn with ``preload_app`` it runs in the
+    master before the port is bound, so forked workers share the parsed
+    templates copy-on-write and the first request finds everything loaded.
+    """
+    global _ready
+    if _ready:
+        return timings
+    with _lock:
+        if _ready:
+            return timings
+        started = time.perf_counter()
+        with timed("import_pipeline_ms"):
+            import mbs
+            from reference_data import ER_CPRP_FILENAME, get_reference
+            from skeleton_template import acquire_template, release_template
+            from xml_writer import get_xml_template
+            from formula_eval import load_model
+
+        with timed("reference_data_ms"):
+            get_reference(os.path.join(os.path.dirname(skeleton_path), ER_CPRP_FILENAME))
+        if mbs.OUTPUT_WRITER == "xml":
+            with timed("xml_template_ms"):
+                get_xml_template(skeleton_path).prepare([mbs.SUMMARY, mbs.ONE_PAGER])
+        else:
+            with timed("skeleton_template_ms"):
+                release_template(acquire_template(skeleton_path))
+        with timed("formula_model_ms"):
+            load_model(skeleton_path)
+
+        timings["warm_up_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        _ready = True
+        logger.info(f"Warm-up finished: {timings}")
+    return timings
+
+def record_request(endpoint, seconds):
+    """Keep the duration of the first processing request this process served."""
+    if "first_request_ms" not in timings:
+        timings["first_request_ms"] = round(seconds * 1000, 1)
+        timings["first_request_endpoint"] = endpoint
+        logger.info(f"First request ({endpoint}) took {timings['first_request_ms']} ms")
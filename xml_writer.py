@@ -0,0 +1,350 @@
+import logging
+import os
+import re
+import zipfile
+from math import isinf, isnan
+from io import BytesIO
+from xml.sax.saxutils import escape
+
+from openpyxl.cell.cell import ERROR_CODES
+from openpyxl.formula.translate import Translator
+from openpyxl.utils.cell import coordinate_from_string, column_index_from_string, range_boundaries, get_column_letter
+
+from file_cache import VersionedCache
+from formula_eval import ExcelError
+
+logger = logging.getLogger(__name__)
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+
+_ROW_RE = re.compile(r'<row\b[^>]*?(?:/>|>.*?</row>)', re.S)
+_CELL_RE = re.compile(r'<c\b[^>]*?(?:/>|>.*?</c>)', re.S)
+_ATTR_RE = r'\b{}="([^"]*)"'
+_SI_RE = re.compile(r'<si>.*?</si>', re.S)
+_PLAIN_SI_RE = re.compile(r'^<si><t(?: xml:space="preserve")?>([^<]*)</t></si>$')
+_SHARED_MASTER_RE = re.compile(r'<f\b[^>]*\bt="shared"[^>]*\bref="[^"]*"[^>]*\bsi="(\d+)"[^>]*>([^<]*)</f>')
+_SHARED_REF_RE = re.compile(r'<f\b[^>]*\bt="shared"[^>]*\bsi="(\d+)"[^>]*/>')
+# Control characters Excel refuses in cell text
+_ILLEGAL_CHARS_RE = re.compile(r'[\000-\010]|[\013-\014]|[\016-\037]')
+
+
+class UnsupportedValue(Exception):
+    """A value the XML writer cannot serialise (e.g. dates); callers fall back to openpyxl."""
+
+def _attr(tag, name):
+    match = re.search(_ATTR_RE.format(name), tag)
+    return match.group(1) if match else None
+
+def _split_ref(cell_ref):
+    column, row = coordinate_from_string(cell_ref)
+    return row, column_index_from_string(column)
+
+def _unescape(text):
+    return text.replace("&lt;", "<").replace("&gt;", ">").replace("&quot;", '"').replace("&apos;", "'").replace("&amp;", "&")
+
+class _SheetPart:
+    """A worksheet XML part split into rows and cells so single cells can be swapped cheaply."""
+
+    def __init__(self, xml):
+        start = xml.index("<sheetData")
+        if xml.startswith("<sheetData/>", start):
+            self.prefix = xml[:start] + "<sheetData>"
+            self.suffix = "</sheetData>" + xml[start + len("<sheetData/>"):]
+            body = ""
+        else:
+            open_end = xml.index(">", start) + 1
+            close = xml.index("</sheetData>", open_end)
+            self.prefix = xml[:open_end]
+            self.suffix = xml[close:]
+            body = xml[open_end:close]
+
+        # row number -> (row open tag, {column index: cell xml}); row open tags keep their attributes
+        self.rows = {}
+        self.masters = {}
+        for row_xml in _ROW_RE.findall(body):
+            tag_end = row_xml.index(">") + 1
+            open_tag = row_xml[:tag_end]
+            row_num = int(_attr(open_tag, "r"))
+            if open_tag.endswith("/>"):
+                open_tag = open_tag[:-2].rstrip() + ">"
+            cells = {}
+            for cell_xml in _CELL_RE.findall(row_xml[tag_end:]):
+                ref = _attr(cell_xml[:cell_xml.index(">") + 1], "r")
+                cells[_split_ref(ref)[1]] = cell_xml
+                master = _SHARED_MASTER_RE.search(cell_xml)
+                if master:
+                    self.masters[master.group(1)] = (ref, _unescape(master.group(2)))
+            self.rows[row_num] = (open_tag, cells)
+
+        self.merged = {}
+        for merged in re.findall(r'<mergeCell ref="([^"]+)"\s*/>', self.suffix):
+            min_col, min_row, max_col, max_row = range_boundaries(merged)
+            anchor = f"{get_column_letter(min_col)}{min_row}"
+            for row in range(min_row, max_row + 1):
+                for col in range(min_col, max_col + 1):
+                    self.merged[f"{get_column_letter(col)}{row}"] = anchor
+
+    def render(self, cells_by_ref, strings, cached=None):
+        """Sheet XML with ``cells_by_ref`` ({A1 ref: value}) written in.
+
+        ``cached`` ({A1 ref: computed value}) is stored as the cached result of
+        formula cells, both written ones and formulas already in the skeleton.
+        """
+        cached = cached or {}
+        rows = dict(self.rows)
+        replaced_masters = {}
+        for cell_ref, value in cells_by_ref.items():
+            row_num, col = _split_ref(cell_ref)
+            open_tag, cells = rows.get(row_num, (f'<row r="{row_num}">', {}))
+            cells = dict(cells)
+            old = cells.get(col)
+            style = None
+            if old is not None:
+                old_tag = old[:old.index(">") + 1]
+                style = _attr(old_tag, "s")
+                if _attr(old_tag, "t") == "s":
+                    strings.release()
+                master = _SHARED_MASTER_RE.search(old)
+                if master:
+                    replaced_masters[master.group(1)] = self.masters[master.group(1)]
+            cells[col] = _cell_xml(cell_ref, style, value, strings, cached.get(cell_ref))
+            rows[row_num] = (open_tag, cells)
+
+        if replaced_masters:
+            self._expand_shared(rows, replaced_masters, cells_by_ref)
+
+        for cell_ref, result in cached.items():
+            if cell_ref in cells_by_ref:
+                continue
+            row_num, col = _split_ref(cell_ref)
+            open_tag, cells = rows.get(row_num, (None, {}))
+            if col in cells and "<f" in cells[col]:
+                cells = dict(cells)
+                cells[col] = _with_cached(cells[col], result)
+                rows[row_num] = (open_tag, cells)
+
+        parts = [self.prefix]
+        for row_num in sorted(rows):
+            open_tag, cells = rows[row_num]
+            parts.append(open_tag)
+            parts.extend(cells[col] for col in sorted(cells))
+            parts.append("</row>")
+        parts.append(self.suffix)
+        return "".join(parts)
+
+    def _expand_shared(self, rows, replaced_masters, written):
+        # The master of a shared formula was overwritten, so give each dependent its own formula
+        for row_num, (open_tag, cells) in list(rows.items()):
+            changed = None
+            for col, cell_xml in cells.items():
+                match = _SHARED_REF_RE.search(cell_xml)
+                if not match or match.group(1) not in replaced_masters:
+                    continue
+                ref = f"{get_column_letter(col)}{row_num}"
+                if ref in written:
+                    continue
+                master_ref, formula = replaced_masters[match.group(1)]
+                translated = Translator("=" + formula, origin=master_ref).translate_formula(ref)[1:]
+                changed = changed or dict(cells)
+                changed[col] = cell_xml.replace(match.group(0), f"<f>{escape(translated)}</f>")
+            if changed:
+                rows[row_num] = (open_tag, changed)
+
+class _SharedStrings:
+    """Per-render view of sharedStrings.xml that appends new strings."""
+
+    def __init__(self, template):
+        self.template = template
+        self.added = []
+        self.index = {}
+        self.count = template.count
+
+    def add(self, text):
+        self.count += 1
+        if text in self.template.string_index:
+            return self.template.string_index[text]
+        if text not in self.index:
+            self.index[text] = len(self.template.items) + len(self.added)
+            space = ' xml:space="preserve"' if text != text.strip() else ""
+            self.added.append(f"<si><t{space}>{escape(text)}</t></si>")
+        return self.index[text]
+
+    def release(self):
+        self.count -= 1
+
+    def render(self):
+        unique = len(self.template.items) + len(self.added)
+        return (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                f'<sst xmlns="{MAIN_NS}" count="{max(self.count, unique)}" uniqueCount="{unique}">'
+                + "".join(self.template.items) + "".join(self.added) + "</sst>")
+
+def _cached_xml(result):
+    """(t attribute, <v> element) for a computed formula result."""
+    if result is None:
+        return "", ""
+    if hasattr(result, "item") and not isinstance(result, str):
+        result = result.item()
+    if isinstance(result, bool):
+        return ' t="b"', f"<v>{int(result)}</v>"
+    if isinstance(result, (int, float)):
+        if isnan(result) or isinf(result):
+            return ' t="e"', "<v>#NUM!</v>"
+        return "", f'<v>{"%.16g" % result}</v>'
+    if isinstance(result, ExcelError):
+        return ' t="e"', f"<v>{escape(result)}</v>"
+    return ' t="str"', f"<v>{escape(str(result))}</v>"
+
+def _with_cached(cell_xml, result):
+    # Replace the cached result of an existing formula cell, keeping its <f> element
+    open_end = cell_xml.index(">") + 1
+    open_tag = re.sub(r'\s+t="[^"]*"', "", cell_xml[:open_end])
+    formula = re.search(r'<f\b[^>]*?(?:/>|>.*?</f>)', cell_xml, re.S).group(0)
+    t_attr, v = _cached_xml(result)
+    if open_tag.endswith("/>"):
+        open_tag = open_tag[:-2].rstrip() + ">"
+    return open_tag[:-1] + t_attr + ">" + formula + v + "</c>"
+
+def _cell_xml(cell_ref, style, value, strings, cached=None):
+    s_attr = f' s="{style}"' if style is not None else ""
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy scalar
+    if value is None or value == "":
+        # openpyxl leaves empty strings as empty cells too
+        return f'<c r="{cell_ref}"{s_attr}/>'
+    if isinstance(value, bool):
+        return f'<c r="{cell_ref}"{s_attr} t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        if isnan(value) or isinf(value):
+            return f'<c r="{cell_ref}"{s_attr}/>'
+        # Same number formatting as openpyxl, so both writers produce the same cell text
+        return f'<c r="{cell_ref}"{s_attr}><v>{"%.16g" % value}</v></c>'
+    if isinstance(value, str):
+        if value.startswith("=") and len(value) > 1:
+            t_attr, v = _cached_xml(cached)
+            return f'<c r="{cell_ref}"{s_attr}{t_attr}><f>{escape(value[1:])}</f>{v}</c>'
+        if value in ERROR_CODES:
+            return f'<c r="{cell_ref}"{s_attr} t="e"><v>{escape(value)}</v></c>'
+        index = strings.add(_ILLEGAL_CHARS_RE.sub("", value))
+        return f'<c r="{cell_ref}"{s_attr} t="s"><v>{index}</v></c>'
+    raise UnsupportedValue(f"Cannot write {type(value).__name__} to {cell_ref} with the XML writer")
+
+class XmlSkeletonTemplate:
+    """Skeleton workbook prepared for output by patching sheet XML directly.
+
+    Every zip member the writer never changes is compressed once into
+    ``base`` (calcChain removed and full recalculation on load enabled, since
+    cached formula results go stale). A render copies ``base`` and appends
+    only the patched sheet parts and sharedStrings.xml.
+    """
+
+    def __init__(self, path, version):
+        self.path = path
+        self.version = version
+        with zipfile.ZipFile(path) as zin:
+            members = {info.filename: zin.read(info) for info in zin.infolist()}
+            infos = {info.filename: info for info in zin.infolist()}
+
+        workbook_xml = members["xl/workbook.xml"].decode("utf-8")
+        rels_xml = members["xl/_rels/workbook.xml.rels"].decode("utf-8")
+        targets = {}
+        for rel in re.findall(r"<Relationship\b[^>]*/>", rels_xml):
+            target = _attr(rel, "Target")
+            targets[_attr(rel, "Id")] = target.lstrip("/") if target.startswith("/") else "xl/" + target
+        self.sheet_titles = []
+        self.sheet_paths = []
+        for sheet in re.findall(r"<sheet\b[^>]*/>", workbook_xml):
+            self.sheet_titles.append(_unescape(_attr(sheet, "name")))
+            self.sheet_paths.append(targets[_attr(sheet, "r:id")])
+
+        self.sheets = {}
+        self.shared_strings_path = next(
+            (path for path in targets.values() if path.endswith("sharedStrings.xml")), "xl/sharedStrings.xml")
+        sst_xml = members.get(self.shared_strings_path, b"").decode("utf-8")
+        self.items = _SI_RE.findall(sst_xml)
+        self.count = int(_attr(sst_xml, "count") or len(self.items)) if sst_xml else 0
+        self.string_index = {}
+        for index, item in enumerate(self.items):
+            plain = _PLAIN_SI_RE.match(item)
+            if plain:
+                self.string_index.setdefault(_unescape(plain.group(1)), index)
+        self._members = members
+        self._infos = infos
+
+        # Static fixes applied once: drop calcChain, recalculate everything on open
+        calc_chain = [name for name in members if name.endswith("calcChain.xml")]
+        for name in calc_chain:
+            members.pop(name)
+        rels_xml = re.sub(r'<Relationship\b[^>]*calcChain[^>]*/>', "", rels_xml)
+        members["xl/_rels/workbook.xml.rels"] = rels_xml.encode("utf-8")
+        content_types = members["[Content_Types].xml"].decode("utf-8")
+        content_types = re.sub(r'<Override\b[^>]*calcChain[^>]*/>', "", content_types)
+        members["[Content_Types].xml"] = content_types.encode("utf-8")
+        if "<calcPr" in workbook_xml:
+            workbook_xml = re.sub(r'<calcPr\b([^>]*?)\s*/>',
+                                  lambda m: "<calcPr" + re.sub(r'\s*fullCalcOnLoad="[^"]*"', "", m.group(1)) + ' fullCalcOnLoad="1"/>',
+                                  workbook_xml, count=1)
+        else:
+            workbook_xml = workbook_xml.replace("</workbook>", '<calcPr fullCalcOnLoad="1"/></workbook>')
+        members["xl/workbook.xml"] = workbook_xml.encode("utf-8")
+        self._base = None
+
+    def sheet(self, index):
+        path = self.sheet_paths[index]
+        if path not in self.sheets:
+            self.sheets[path] = _SheetPart(self._members[path].decode("utf-8"))
+        return self.sheets[path]
+
+    def anchors(self, index):
+        return self.sheet(index).merged
+
+    def prepare(self, sheet_indexes):
+        """Parse ``sheet_indexes`` and build the base archive ahead of the first render."""
+        for index in sheet_indexes:
+            self.sheet(index)
+        self.base(frozenset([self.sheet_paths[index] for index in sheet_indexes] + [self.shared_strings_path]))
+
+    def base(self, patched):
+        """Compressed zip of every member outside ``patched``, built once per set of patched parts."""
+        if self._base is None or self._base[0] != patched:
+            buffer = BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zout:
+                for name, data in self._members.items():
+                    if name not in patched:
+                        zout.writestr(self._infos[name].filename, data)
+            self._base = (patched, buffer.getvalue())
+        return self._base[1]
+
+    def render(self, writes, cached=None):
+        """Output workbook bytes for ``writes``: (sheet index, A1 ref, value) in write order.
+
+        Merged cells are redirected to their anchor and later writes win, as with
+        openpyxl. ``cached`` ({(sheet index, A1 ref): value}) supplies computed
+        formula results to store alongside the formulas.
+        """
+        cached_by_sheet = {}
+        for (sheet_index, cell_ref), result in (cached or {}).items():
+            cached_by_sheet.setdefault(sheet_index, {})[cell_ref] = result
+        by_sheet = {}
+        for sheet_index, cell_ref, value in writes:
+            cell_ref = self.anchors(sheet_index).get(cell_ref, cell_ref)
+            by_sheet.setdefault(sheet_index, {})[cell_ref] = value
+
+        strings = _SharedStrings(self)
+        patched = {}
+        for sheet_index in sorted(set(by_sheet) | set(cached_by_sheet)):
+            sheet_xml = self.sheet(sheet_index).render(by_sheet.get(sheet_index, {}), strings, cached_by_sheet.get(sheet_index))
+            patched[self.sheet_paths[sheet_index]] = sheet_xml.encode("utf-8")
+        patched[self.shared_strings_path] = strings.render().encode("utf-8")
+
+        buffer = BytesIO(self.base(frozenset(patched)))
+        buffer.seek(0, os.SEEK_END)
+        with zipfile.ZipFile(buffer, "a", zipfile.ZIP_DEFLATED) as zout:
+            for name, data in patched.items():
+                zout.writestr(name, data)
+        return buffer.getvalue()
+
+_templates = VersionedCache(XmlSkeletonTemplate, "XML skeleton template")
+
+def get_xml_template(path):
+    """XML template for ``path``, parsed once per worker and reloaded when the file changes."""
+    return _templates.get(path)